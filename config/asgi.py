@@ -1,17 +1,24 @@
 import os
 
-from channels.auth import AuthMiddlewareStack
-from channels.routing import ProtocolTypeRouter
-from channels.routing import URLRouter
 from django.core.asgi import get_asgi_application
 
-from library_management.libraries.routing import websocket_urlpatterns
-
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
 
+# Set up Django before importing consumers and middleware that use models.
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter  # noqa: E402
+from channels.routing import URLRouter  # noqa: E402
+
+from library_management.libraries.middleware import JWTAuthMiddleware  # noqa: E402
+from library_management.libraries.routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
-        "websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+        "http": django_asgi_app,
+        "websocket": AuthMiddlewareStack(
+            JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+        ),
     },
 )
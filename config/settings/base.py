@@ -74,6 +74,7 @@ DJANGO_APPS = [
     "django.contrib.staticfiles",
     # "django.contrib.humanize", # Handy template tags
     "django.contrib.admin",
+    "django.contrib.postgres",
     "django.forms",
 ]
 THIRD_PARTY_APPS = [
@@ -316,6 +317,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "library_management.libraries.tasks.send_due_soon_reminders",
         "schedule": crontab(hour=8, minute=0),  # Every day at 8:00 AM
     },
+    "sweep-overdue-transactions-every-night": {
+        "task": "library_management.libraries.tasks.sweep_overdue_transactions",
+        "schedule": crontab(hour=0, minute=5),  # Every day at 00:05 AM
+    },
 }
 # django-rest-framework
 # -------------------------------------------------------------------------------
@@ -383,3 +388,27 @@ CACHES = {
         "KEY_PREFIX": "library",
     },
 }
+# Serialize book and loaded-author listings from values() rows instead of DRF fields
+CATALOGUE_FAST_SERIALIZERS = env.bool("DJANGO_CATALOGUE_FAST_SERIALIZERS", default=True)
+# Decimal places coordinates are snapped to in catalogue cache keys (~1.1 km at 2)
+CATALOGUE_CACHE_COORDINATE_PRECISION = env.int(
+    "DJANGO_CATALOGUE_CACHE_COORDINATE_PRECISION",
+    default=2,
+)
+# Rank nearest libraries with an in-process NumPy index instead of SQL trigonometry
+LIBRARY_GEO_INDEX = env.bool("DJANGO_LIBRARY_GEO_INDEX", default=False)
+# Cache /api/books/ without inventory and overlay current availability per response
+CATALOGUE_AVAILABILITY_OVERLAY = env.bool(
+    "DJANGO_CATALOGUE_AVAILABILITY_OVERLAY",
+    default=True,
+)
+# Coalesce borrow confirmations for this many seconds per process (0 sends each one)
+BORROW_CONFIRMATION_COALESCE_SECONDS = env.int(
+    "DJANGO_BORROW_CONFIRMATION_COALESCE_SECONDS",
+    default=0,
+)
+# Seconds to coalesce committed availability broadcasts over (0 sends each commit)
+AVAILABILITY_BROADCAST_WINDOW = env.float(
+    "DJANGO_AVAILABILITY_BROADCAST_WINDOW",
+    default=0.05,
+)
@@ -1,6 +1,7 @@
 # admin.py
 from django.contrib import admin
 
+from .models import ActiveLoanCounter
 from .models import Author
 from .models import Book
 from .models import BorrowingTransaction
@@ -10,19 +11,19 @@ from .models import Library
 
 @admin.register(Library)
 class LibraryAdmin(admin.ModelAdmin):
-    list_display = ["name", "address", "phone", "email"]
+    list_display = ["name", "address", "phone", "email", "book_count"]
     search_fields = ["name", "address"]
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ["name", "description"]
+    list_display = ["name", "description", "book_count"]
     search_fields = ["name"]
 
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
-    list_display = ["first_name", "last_name", "birth_date"]
+    list_display = ["first_name", "last_name", "birth_date", "book_count"]
     search_fields = ["first_name", "last_name"]
 
 
@@ -40,9 +41,21 @@ class BookAdmin(admin.ModelAdmin):
     search_fields = ["title", "isbn"]
     filter_horizontal = ["authors"]
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.search(search_term), False
+
 
 @admin.register(BorrowingTransaction)
 class BorrowingTransactionAdmin(admin.ModelAdmin):
     list_display = ["user", "borrow_date", "expected_return_date", "status"]
     list_filter = ["status", "borrow_date"]
     filter_horizontal = ["books"]
+
+
+@admin.register(ActiveLoanCounter)
+class ActiveLoanCounterAdmin(admin.ModelAdmin):
+    list_display = ["user", "active_books"]
+    search_fields = ["user__email"]
+    readonly_fields = ["user", "active_books"]
@@ -0,0 +1,118 @@
+"""Read-only list serializers built from ``.values()`` rows.
+
+They produce the same JSON as ``BookSerializer`` and ``LoadedAuthorSerializer``
+without instantiating models or walking DRF field machinery per object.
+"""
+
+from library_management.libraries.models import Book
+
+BOOK_FIELDS = [
+    "id",
+    "title",
+    "isbn",
+    "category_id",
+    "category__name",
+    "library_id",
+    "library__name",
+    "publication_year",
+    "available_copies",
+    "total_copies",
+]
+AUTHOR_FIELDS = ["id", "first_name", "last_name", "bio", "birth_date"]
+
+
+def get_book_authors(book_ids):
+    """Map book ids to their {id, full_name} author entries in one query"""
+    rows = (
+        Book.authors.through.objects.filter(book_id__in=book_ids)
+        .order_by("id")
+        .values_list("book_id", "author_id", "author__first_name", "author__last_name")
+    )
+    authors = {book_id: [] for book_id in book_ids}
+    for book_id, author_id, first_name, last_name in rows:
+        authors[book_id].append(
+            {"id": author_id, "full_name": f"{first_name} {last_name}"},
+        )
+    return authors
+
+
+def get_author_books(author_ids):
+    """Map author ids to their nested book entries in one query"""
+    rows = (
+        Book.authors.through.objects.filter(author_id__in=author_ids)
+        .order_by("id")
+        .values_list("author_id", *(f"book__{field}" for field in BOOK_FIELDS))
+    )
+    books = {author_id: [] for author_id in author_ids}
+    for author_id, *values in rows:
+        row = dict(zip(BOOK_FIELDS, values, strict=True))
+        books[author_id].append(
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "isbn": row["isbn"],
+                "library": {"id": row["library_id"], "name": row["library__name"]},
+                "publication_year": row["publication_year"],
+                "available_copies": row["available_copies"],
+                "total_copies": row["total_copies"],
+                "is_available": row["available_copies"] > 0,
+                "category": {"id": row["category_id"], "name": row["category__name"]},
+            },
+        )
+    return books
+
+
+class FastBookListSerializer:
+    """Same output as ``BookSerializer(many=True)`` for rows from get_rows()"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @staticmethod
+    def get_rows(queryset):
+        return queryset.prefetch_related(None).values(*BOOK_FIELDS)
+
+    @property
+    def data(self):
+        authors = get_book_authors([row["id"] for row in self.rows])
+        return [
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "isbn": row["isbn"],
+                "authors": authors[row["id"]],
+                "category": {"id": row["category_id"], "name": row["category__name"]},
+                "library": {"id": row["library_id"], "name": row["library__name"]},
+                "publication_year": row["publication_year"],
+                "available_copies": row["available_copies"],
+                "total_copies": row["total_copies"],
+                "is_available": row["available_copies"] > 0,
+            }
+            for row in self.rows
+        ]
+
+
+class FastLoadedAuthorListSerializer:
+    """Same output as ``LoadedAuthorSerializer(many=True)`` for rows from get_rows()"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @staticmethod
+    def get_rows(queryset):
+        return queryset.prefetch_related(None).values(*AUTHOR_FIELDS)
+
+    @property
+    def data(self):
+        books = get_author_books([row["id"] for row in self.rows])
+        return [
+            {
+                "id": row["id"],
+                "first_name": row["first_name"],
+                "last_name": row["last_name"],
+                "bio": row["bio"],
+                "birth_date": row["birth_date"] and row["birth_date"].isoformat(),
+                "books": books[row["id"]],
+            }
+            for row in self.rows
+        ]
@@ -1,69 +1,128 @@
 import django_filters
+from django.db.models import Exists
+from django.db.models import OuterRef
 
 from library_management.libraries.models import Author
 from library_management.libraries.models import Book
+from library_management.libraries.models import Category
 from library_management.libraries.models import Library
+from library_management.libraries.models import SubqueryCount
 
 
-class LibraryFilter(django_filters.FilterSet):
-    category = django_filters.CharFilter(
-        field_name="library_books__category__name",
-        lookup_expr="iexact",
-    )
-    author = django_filters.CharFilter(
-        field_name="library_books__authors__last_name",
-        lookup_expr="icontains",
+def resolve_ids(model, field_name, value):
+    """Resolve a case-insensitive name to matching ids with one indexed query"""
+    return list(
+        model.objects.filter(**{f"{field_name}__iexact": value}).values_list(
+            "pk",
+            flat=True,
+        ),
     )
 
+
+def authored_books(**filters):
+    """EXISTS-ready through rows linking the outer author to matching books"""
+    return Book.authors.through.objects.filter(author_id=OuterRef("pk"), **filters)
+
+
+class LibraryFilter(django_filters.FilterSet):
+    category = django_filters.CharFilter(method="filter_category")
+    author = django_filters.CharFilter(method="filter_author")
+
     class Meta:
         model = Library
         fields = ["category", "author"]
 
+    def filter_category(self, queryset, name, value):
+        category_ids = resolve_ids(Category, "name", value)
+        return queryset.filter(
+            Exists(
+                Book.objects.filter(
+                    library_id=OuterRef("pk"),
+                    category_id__in=category_ids,
+                ),
+            ),
+        )
+
+    def filter_author(self, queryset, name, value):
+        return queryset.filter(
+            Exists(
+                Book.authors.through.objects.filter(
+                    book__library_id=OuterRef("pk"),
+                    author__last_name__icontains=value,
+                ),
+            ),
+        )
+
 
 class AuthorFilter(django_filters.FilterSet):
-    library = django_filters.CharFilter(
-        field_name="authored_books__library__name",
-        lookup_expr="iexact",
-    )
-    category = django_filters.CharFilter(
-        field_name="authored_books__category__name",
-        lookup_expr="iexact",
-    )
+    """Keep authors with a book in the library and category and count only
+    those books, resolving each name once for both
+    """
+
+    library = django_filters.CharFilter()
+    category = django_filters.CharFilter()
 
     class Meta:
         model = Author
         fields = ["library", "category"]
 
+    def filter_queryset(self, queryset):
+        book_filter = {}
+        if library := self.form.cleaned_data.get("library"):
+            book_filter["book__library_id__in"] = resolve_ids(Library, "name", library)
+        if category := self.form.cleaned_data.get("category"):
+            book_filter["book__category_id__in"] = resolve_ids(
+                Category,
+                "name",
+                category,
+            )
+        if not book_filter:
+            return queryset
+        return queryset.filter(Exists(authored_books(**book_filter))).annotate(
+            listed_book_count=SubqueryCount(authored_books(**book_filter).values("pk")),
+        )
+
 
 class BookFilter(django_filters.FilterSet):
-    category = django_filters.CharFilter(
-        field_name="category__name",
-        lookup_expr="iexact",
-    )
-    library = django_filters.CharFilter(
-        field_name="library__name",
-        lookup_expr="iexact",
-    )
-    author = django_filters.CharFilter(
-        field_name="authors__last_name",
-        lookup_expr="iexact",
-    )
+    category = django_filters.CharFilter(method="filter_category")
+    library = django_filters.CharFilter(method="filter_library")
+    author = django_filters.CharFilter(method="filter_author")
 
     class Meta:
         model = Book
         fields = ["category", "library", "author"]
 
+    def filter_category(self, queryset, name, value):
+        return queryset.filter(category_id__in=resolve_ids(Category, "name", value))
+
+    def filter_library(self, queryset, name, value):
+        return queryset.filter(library_id__in=resolve_ids(Library, "name", value))
+
+    def filter_author(self, queryset, name, value):
+        author_ids = resolve_ids(Author, "last_name", value)
+        return queryset.filter(
+            pk__in=Book.authors.through.objects.filter(
+                author_id__in=author_ids,
+            ).values("book_id"),
+        )
+
 
 class LoadedAuthorFilter(django_filters.FilterSet):
-    category = django_filters.CharFilter(
-        field_name="authored_books__category__name",
-        lookup_expr="iexact",
-    )
-    library = django_filters.CharFilter(
-        field_name="authored_books__library__name",
-        lookup_expr="iexact",
-    )
+    category = django_filters.CharFilter(method="filter_category")
+    library = django_filters.CharFilter(method="filter_library")
 
     class Meta:
         model = Author
         fields = ["category", "library"]
+
+    def filter_category(self, queryset, name, value):
+        category_ids = resolve_ids(Category, "name", value)
+        return queryset.filter(
+            Exists(authored_books(book__category_id__in=category_ids)),
+        )
+
+    def filter_library(self, queryset, name, value):
+        library_ids = resolve_ids(Library, "name", value)
+        return queryset.filter(
+            Exists(authored_books(book__library_id__in=library_ids)),
+        )
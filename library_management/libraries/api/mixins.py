@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from library_management.libraries.cache import CATALOGUE_CACHE_TIMEOUT
+from library_management.libraries.cache import canonicalize_query
+from library_management.libraries.cache import get_available_copies
+from library_management.libraries.cache import get_catalogue_cache_key
+from library_management.libraries.cache import record_cache_lookup
+
+
+class CachedListMixin:
+    """Cache list responses under keys that change with the data they depend on.
+    cache_scopes names the versions bumped by the invalidation signals.
+    """
+
+    cache_scopes = ()
+    cache_timeout = CATALOGUE_CACHE_TIMEOUT
+    cache_casefold_params = ("category", "library", "author")
+    cache_coordinate_params = ("latitude", "longitude")
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def get_cache_url(self, request):
+        query = canonicalize_query(
+            request.query_params,
+            casefold=self.cache_casefold_params,
+            coordinates=self.cache_coordinate_params,
+        )
+        return f"{request.build_absolute_uri(request.path)}?{query}"
+
+    def list(self, request, *args, **kwargs):
+        key = get_catalogue_cache_key(
+            self.basename,
+            self.get_cache_scopes(),
+            self.get_cache_url(request),
+        )
+        data = cache.get(key)
+        record_cache_lookup(self.basename, hit=data is not None)
+        if data is not None:
+            return self.finalize_cached_response(Response(data))
+
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, self.cache_timeout)
+        return self.finalize_cached_response(response)
+
+    def finalize_cached_response(self, response):
+        return response
+
+
+class AvailabilityOverlayMixin(CachedListMixin):
+    """Cache book listings without their inventory and fill in current
+    available_copies / is_available from the availability cache per response.
+    """
+
+    def use_availability_overlay(self):
+        return settings.CATALOGUE_AVAILABILITY_OVERLAY
+
+    def get_cache_scopes(self):
+        if self.use_availability_overlay():
+            return self.cache_scopes
+        return [*self.cache_scopes, "inventory"]
+
+    def finalize_cached_response(self, response):
+        if not self.use_availability_overlay():
+            return response
+        books = response.data
+        if isinstance(books, dict):
+            books = books["results"]
+        available = get_available_copies([book["id"] for book in books])
+        for book in books:
+            book["available_copies"] = available.get(book["id"], 0)
+            book["is_available"] = book["available_copies"] > 0
+        return response
+
+
+class FastListMixin:
+    """Serve list responses through a values()-based fast serializer"""
+
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.CATALOGUE_FAST_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.fast_serializer_class.get_rows(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer_class(page).data)
+        return Response(self.fast_serializer_class(rows).data)
@@ -1,4 +1,8 @@
+from django.db import connection
+from rest_framework.pagination import BasePagination
+from rest_framework.pagination import CursorPagination
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
 
 
 class CustomPagination(PageNumberPagination):
@@ -8,3 +12,85 @@ class CustomPagination(PageNumberPagination):
 
     def get_paginated_response(self, data):
         return super().get_paginated_response(data)
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination on the primary key, without a COUNT(*) per page.
+    Unfiltered listings report the planner's row estimate instead.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.estimated_count = None
+        if not queryset.query.where:
+            self.estimated_count = get_estimated_count(queryset.model)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "estimated_count": self.estimated_count,
+                "results": data,
+            },
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["estimated_count"] = {
+            "type": "integer",
+            "nullable": True,
+        }
+        return response_schema
+
+
+class CatalogueSwitchablePagination(BasePagination):
+    """Page number pagination by default, keyset pagination when the
+    request passes ?pagination=cursor or a cursor.
+    """
+
+    page_number_class = PageNumberPagination
+    keyset_class = KeysetPagination
+
+    def __init__(self):
+        self.delegate = self.page_number_class()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        use_keyset = (
+            request.query_params.get("pagination") == "cursor"
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+        self.delegate = self.keyset_class() if use_keyset else self.page_number_class()
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.delegate.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.page_number_class().get_schema_operation_parameters(view),
+            *self.keyset_class().get_schema_operation_parameters(view),
+        ]
+
+
+def get_estimated_count(model):
+    """Get the planner's row estimate for a table, or None if unavailable"""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],  # noqa: SLF001
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 for tables that were never analyzed.
+    if not row or row[0] < 0:
+        return None
+    return row[0]
@@ -11,7 +11,7 @@ from library_management.libraries.models import Book
 from library_management.libraries.models import BorrowingTransaction
 from library_management.libraries.models import Category
 from library_management.libraries.models import Library
-from library_management.libraries.tasks import send_borrow_confirmation_email
+from library_management.libraries.notifications import schedule_borrow_confirmation
 
 User = get_user_model()
 
@@ -38,7 +38,7 @@ class LibrarySerializer(serializers.ModelSerializer):
 
 
 class AuthorSerializer(serializers.ModelSerializer):
-    book_count = serializers.IntegerField(read_only=True)
+    book_count = serializers.IntegerField(read_only=True, source="listed_book_count")
 
     class Meta:
         model = Author
@@ -166,14 +166,18 @@ class BorrowingTransactionCreateSerializer(serializers.ModelSerializer):
                 titles = ", ".join(b.title for b in unavailable)
                 msg = f"The following books are not available: {titles}"
                 raise serializers.ValidationError(msg)
-            BorrowingTransaction.validate_user_borrowing_limit(user, len(books))
+            BorrowingTransaction.validate_user_borrowing_limit(
+                user,
+                len(books),
+                lock=True,
+            )
 
             transaction_instance = BorrowingTransaction.objects.create(
                 user=user,
                 expected_return_date=validated_data["expected_return_date"],
             )
             transaction_instance.books.set(locked_books)
-            send_borrow_confirmation_email.delay(
+            schedule_borrow_confirmation(
                 user.email,
                 [book.title for book in locked_books],
                 str(transaction_instance.expected_return_date),
@@ -1,4 +1,5 @@
-from django.db.models import Count
+import math
+
 from django.db.models import ExpressionWrapper
 from django.db.models import F
 from django.db.models import FloatField
@@ -6,24 +7,34 @@ from django.db.models import Func
 from django.db.models import Prefetch
 from django.db.models import Q
 from django.db.models import Value
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.db.models.functions import Least
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from library_management.libraries.cache import snap_coordinate
+from library_management.libraries.geo import RankedLibraries
+from library_management.libraries.geo import get_bounding_box
+from library_management.libraries.geo import library_geo_index
 from library_management.libraries.models import Author
 from library_management.libraries.models import Book
 from library_management.libraries.models import BorrowingTransaction
 from library_management.libraries.models import Library
 from library_management.users.api.permissions import IsMember
 
+from .fast_serializers import FastBookListSerializer
+from .fast_serializers import FastLoadedAuthorListSerializer
 from .filters import AuthorFilter
 from .filters import BookFilter
 from .filters import LibraryFilter
 from .filters import LoadedAuthorFilter
+from .mixins import AvailabilityOverlayMixin
+from .mixins import CachedListMixin
+from .mixins import FastListMixin
+from .pagination import CatalogueSwitchablePagination
 from .pagination import CustomPagination
 from .serializers import AuthorSerializer
 from .serializers import BookSerializer
@@ -54,82 +65,161 @@ class ACos(Func):
     arity = 1
 
 
-@method_decorator(cache_page(60 * 60), name="list")
-class LibraryViewSet(viewsets.ModelViewSet):
+class LibraryViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cache_scopes = ["library", "book", "category", "author"]
     serializer_class = LibrarySerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = LibraryFilter
     http_method_names = ["get"]
 
     def get_queryset(self):
-        queryset = Library.objects.annotate(book_count=Count("library_books"))
+        queryset = Library.objects.all()
+
+        coordinates = self.get_coordinates()
+        if coordinates is None or library_geo_index.is_enabled():
+            return queryset
+
+        lat, lon, radius = coordinates
+        if radius is not None:
+            queryset = queryset.filter(self.get_bounding_box_filter(lat, lon, radius))
+
+        queryset = queryset.annotate(
+            distance=ExpressionWrapper(
+                6371
+                * ACos(
+                    Least(
+                        Cos(Radians(Value(lat)))
+                        * Cos(Radians(F("latitude")))
+                        * Cos(Radians(F("longitude") - Value(lon)))
+                        + Sin(Radians(Value(lat))) * Sin(Radians(F("latitude"))),
+                        Value(1.0),
+                    ),
+                ),
+                output_field=FloatField(),
+            ),
+        ).order_by("distance")
 
+        if radius is not None:
+            queryset = queryset.filter(distance__lte=radius)
+        return queryset
+
+    def get_coordinates(self):
+        """Get (latitude, longitude, radius) from the query, or None"""
         lat = self.request.query_params.get("latitude")
         lon = self.request.query_params.get("longitude")
-
-        if lat and lon:
-            try:
-                lat = float(lat)
-                lon = float(lon)
-
-                queryset = queryset.annotate(
-                    distance=ExpressionWrapper(
-                        6371
-                        * ACos(
-                            Cos(Radians(Value(lat)))
-                            * Cos(Radians(F("latitude")))
-                            * Cos(Radians(F("longitude") - Value(lon)))
-                            + Sin(Radians(Value(lat))) * Sin(Radians(F("latitude"))),
-                        ),
-                        output_field=FloatField(),
-                    ),
-                ).order_by("distance")
-            except ValueError:
-                pass
-
+        radius = self.request.query_params.get("radius")
+        if not (lat and lon):
+            return None
+        try:
+            lat, lon = float(lat), float(lon)
+            radius = float(radius) if radius else None
+        except ValueError:
+            return None
+        # float() accepts "nan" and "inf", which the lookups cannot compare.
+        if not (math.isfinite(lat) and math.isfinite(lon)):
+            return None
+        if radius is not None and not (math.isfinite(radius) and radius >= 0):
+            return None
+        # Snap to the cache grid so responses match their normalized cache key.
+        return snap_coordinate(lat), snap_coordinate(lon), radius
+
+    def get_bounding_box_filter(self, lat, lon, radius):
+        min_lat, max_lat, min_lon, max_lon = get_bounding_box(lat, lon, radius)
+        box = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+        if min_lon <= max_lon:
+            return box & Q(longitude__gte=min_lon, longitude__lte=max_lon)
+        return box & (Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+    def get_limit(self):
+        try:
+            return max(int(self.request.query_params.get("limit", 0)), 0)
+        except ValueError:
+            return 0
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action != "list":
+            return queryset
+
+        limit = self.get_limit()
+        coordinates = self.get_coordinates()
+        if coordinates is not None and library_geo_index.is_enabled():
+            lat, lon, radius = coordinates
+            candidates = None
+            params = self.request.query_params
+            if any(params.get(name) for name in self.filterset_class.base_filters):
+                candidates = queryset.values_list("pk", flat=True)
+            ids, distances = library_geo_index.nearest(
+                lat,
+                lon,
+                k=limit or None,
+                radius=radius,
+                candidates=candidates,
+            )
+            return RankedLibraries(queryset, ids, distances)
+
+        if limit:
+            queryset = queryset[:limit]
         return queryset
 
 
-@method_decorator(cache_page(60 * 60), name="list")
-class AuthorViewSet(viewsets.ReadOnlyModelViewSet):
+class AuthorViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_scopes = ["author", "book", "library", "category"]
     serializer_class = AuthorSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = AuthorFilter
+    pagination_class = CatalogueSwitchablePagination
     http_method_names = ["get"]
 
     def get_queryset(self):
-        library = self.request.query_params.get("library")
-        category = self.request.query_params.get("category")
-
-        book_filter = Q()
-        if library:
-            book_filter &= Q(authored_books__library__name__iexact=library)
-        if category:
-            book_filter &= Q(authored_books__category__name__iexact=category)
-
+        # Unfiltered listings read the maintained column; AuthorFilter
+        # replaces it with a count of the books matching the filter.
         return Author.objects.annotate(
-            book_count=Count("authored_books", filter=book_filter),
-        )
+            listed_book_count=F("book_count"),
+        ).order_by("id")
 
 
-@method_decorator(cache_page(60 * 60), name="list")
-class BookViewSet(viewsets.ReadOnlyModelViewSet):
+class BookViewSet(
+    AvailabilityOverlayMixin,
+    FastListMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
+    cache_scopes = ["book", "author", "category", "library"]
     serializer_class = BookSerializer
+    fast_serializer_class = FastBookListSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = BookFilter
+    pagination_class = CatalogueSwitchablePagination
     http_method_names = ["get"]
 
     def get_queryset(self):
         return (
             Book.objects.select_related("category", "library")
             .prefetch_related("authors")
-            .all()
+            .order_by("id")
         )
 
-
-@method_decorator(cache_page(60 * 60), name="list")
-class LoadedAuthorViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
+        """Full-text prefix search over title, ISBN, authors and description"""
+        queryset = self.filter_queryset(self.get_queryset()).search(
+            request.query_params.get("q", ""),
+        )
+        # Results are ordered by rank, so keyset pagination on id does not apply.
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class LoadedAuthorViewSet(
+    CachedListMixin,
+    FastListMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
+    cache_scopes = ["book", "author", "category", "library", "inventory"]
     serializer_class = LoadedAuthorSerializer
+    fast_serializer_class = FastLoadedAuthorListSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = LoadedAuthorFilter
     pagination_class = CustomPagination
@@ -139,7 +229,7 @@ class LoadedAuthorViewSet(viewsets.ReadOnlyModelViewSet):
         return Author.objects.prefetch_related(
             Prefetch(
                 "authored_books",
-                queryset=Book.objects.select_related("category"),
+                queryset=Book.objects.select_related("category", "library"),
             ),
         )
 
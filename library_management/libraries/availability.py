@@ -0,0 +1,168 @@
+import time
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .buffers import CoalescingBuffer
+from .cache import get_counters
+from .cache import incr_counter
+
+# Checked in this order, so a socket subscribed to several topics
+# matching one book gets its event only from the first.
+AVAILABILITY_TOPICS = ["book", "library", "category"]
+AVAILABILITY_FIELDS = ["id", "title", "library_id", "category_id"]
+AVAILABILITY_BATCH_SIZE = 500
+# Events kept per topic group for clients resuming after a reconnect.
+REPLAY_SIZE = 1000
+REPLAY_TIMEOUT = 60 * 60
+
+
+def get_topic_group(topic, pk):
+    return f"availability.{topic}.{pk}"
+
+
+def get_book_groups(book):
+    """Topic groups interested in a book event, in delivery order"""
+    return [
+        get_topic_group(topic, book[f"{topic}_id"]) for topic in AVAILABILITY_TOPICS
+    ]
+
+
+def _seq_key(group):
+    return f"availability:seq:{group}"
+
+
+def _event_key(group, seq):
+    return f"availability:event:{group}:{seq}"
+
+
+def _initial_seq():
+    # Microseconds, to stay exact in JSON clients.
+    return time.time_ns() // 1000
+
+
+def get_topic_seqs(groups):
+    """Get the last sequence number of every topic group"""
+    keys = {group: _seq_key(group) for group in groups}
+    seqs = get_counters(list(keys.values()), _initial_seq())
+    return {group: seqs[key] for group, key in keys.items()}
+
+
+def record_events(topic, group, events):
+    """Number a topic group's events and keep the last REPLAY_SIZE for replay"""
+    last = incr_counter(_seq_key(group), len(events), initial=_initial_seq())
+    first = last - len(events) + 1
+    numbered = [
+        {**event, "topic": topic, "seq": seq}
+        for seq, event in enumerate(events, start=first)
+    ]
+    cache.set_many(
+        {_event_key(group, event["seq"]): event for event in numbered},
+        timeout=REPLAY_TIMEOUT,
+    )
+    cache.delete_many(
+        [_event_key(group, seq - REPLAY_SIZE) for seq in range(first, last + 1)],
+    )
+    return numbered
+
+
+def get_replay(group, since):
+    """Events of a topic group after since, or None if some are no longer kept"""
+    last = get_topic_seqs([group])[group]
+    if not last - REPLAY_SIZE <= since <= last:
+        return None
+    keys = [_event_key(group, seq) for seq in range(since + 1, last + 1)]
+    events = cache.get_many(keys)
+    if len(events) < len(keys):
+        return None
+    return [events[key] for key in keys]
+
+
+def get_snapshot(topic, pk):
+    """Current availability of every book in a topic, as [book_id, copies] pairs"""
+    from .models import Book
+
+    group = get_topic_group(topic, pk)
+    seq = get_topic_seqs([group])[group]
+    lookup = "id" if topic == "book" else f"{topic}_id"
+    books = Book.objects.filter(**{lookup: pk}).order_by("id")
+    return {
+        "topic": topic,
+        "id": pk,
+        "seq": seq,
+        "books": [list(row) for row in books.values_list("id", "available_copies")],
+    }
+
+
+def resume_topic(topic, pk, since):
+    """Replay what a client missed since seq, or fall back to a snapshot"""
+    events = get_replay(get_topic_group(topic, pk), since)
+    if events is None:
+        return {"snapshot": get_snapshot(topic, pk)}
+    return {"events": events}
+
+
+def send_availability_events(events):
+    """Send every interested topic group all of its events in one message"""
+    batches = defaultdict(list)
+    for event in events:
+        for topic in AVAILABILITY_TOPICS:
+            group = get_topic_group(topic, event[f"{topic}_id"])
+            batches[topic, group].append(event)
+    numbered = {
+        group: record_events(topic, group, group_events)
+        for (topic, group), group_events in batches.items()
+    }
+
+    channel_layer = get_channel_layer()
+
+    async def send_batches():
+        for group, group_events in numbered.items():
+            await channel_layer.group_send(
+                group,
+                {"type": "availability_events", "group": group, "events": group_events},
+            )
+
+    async_to_sync(send_batches)()
+
+
+availability_buffer = CoalescingBuffer(
+    send_availability_events,
+    AVAILABILITY_BATCH_SIZE,
+)
+
+
+def queue_availability_events(books, event, available_copies):
+    """Queue one event per book, broadcast after commit"""
+    events = [
+        {
+            "event": event,
+            "book_id": book["id"],
+            "library_id": book["library_id"],
+            "category_id": book["category_id"],
+            "title": book["title"],
+            "available_copies": available_copies,
+        }
+        for book in books
+    ]
+    if events:
+        transaction.on_commit(
+            lambda: availability_buffer.add(
+                events,
+                settings.AVAILABILITY_BROADCAST_WINDOW,
+            ),
+        )
+
+
+def notify_books_available(books):
+    """Announce books whose last copy out was returned"""
+    queue_availability_events(books, "available", 1)
+
+
+def notify_books_unavailable(books):
+    """Announce books whose last copy was borrowed"""
+    queue_availability_events(books, "unavailable", 0)
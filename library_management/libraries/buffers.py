@@ -0,0 +1,54 @@
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingBuffer:
+    """Collect items per process and hand them to send() in batches,
+    at most delay seconds after the first one arrives. A failing send() is
+    logged, since it runs after the caller's commit or on a timer thread.
+    """
+
+    def __init__(self, send, max_size):
+        self.send = send
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.pending = []
+        self.timer = None
+        atexit.register(self.flush)
+
+    def add(self, items, delay):
+        with self.lock:
+            self.pending.extend(items)
+            if delay <= 0 or len(self.pending) >= self.max_size:
+                batch = self.take()
+            else:
+                batch = None
+                if self.timer is None:
+                    self.timer = threading.Timer(delay, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+        if batch:
+            self.send_batch(batch)
+
+    def take(self):
+        """Empty the buffer; the caller must hold the lock"""
+        batch, self.pending = self.pending, []
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return batch
+
+    def flush(self):
+        with self.lock:
+            batch = self.take()
+        if batch:
+            self.send_batch(batch)
+
+    def send_batch(self, batch):
+        try:
+            self.send(batch)
+        except Exception:
+            logger.exception("Failed to send a batch of %s items", len(batch))
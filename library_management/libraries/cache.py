@@ -0,0 +1,160 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOGUE_CACHE_TIMEOUT = 60 * 60
+# Short enough to bound staleness if a fill races a concurrent checkout.
+AVAILABILITY_CACHE_TIMEOUT = 60
+
+
+def _version_key(scope):
+    return f"catalogue:version:{scope}"
+
+
+def get_counters(keys, initial):
+    """Get the value of every counter, starting missing ones at initial.
+    Counters seeded from the clock never reuse values after an eviction.
+    """
+    counters = cache.get_many(keys)
+    for key in keys:
+        if key not in counters:
+            cache.add(key, initial, timeout=None)
+            counters[key] = cache.get(key)
+    return counters
+
+
+def incr_counter(key, delta=1, initial=0):
+    """Add delta to a counter, starting it at initial if it is missing.
+    Returns the new value.
+    """
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key, delta)
+
+
+def get_cache_versions(scopes):
+    """Get the current version of every scope, creating missing ones"""
+    keys = [_version_key(scope) for scope in scopes]
+    versions = get_counters(keys, time.time_ns())
+    return [versions[key] for key in keys]
+
+
+def bump_cache_version(scope):
+    """Invalidate every cached response that depends on scope"""
+    incr_counter(_version_key(scope), initial=time.time_ns())
+
+
+def invalidate_on_commit(*scopes):
+    """Bump the given scopes once the current transaction commits"""
+
+    def bump():
+        for scope in scopes:
+            bump_cache_version(scope)
+
+    transaction.on_commit(bump)
+
+
+def snap_coordinate(value):
+    """Round a coordinate to the configured catalogue cache grid"""
+    precision = settings.CATALOGUE_CACHE_COORDINATE_PRECISION
+    if precision is None:
+        return value
+    return round(value, precision)
+
+
+def canonicalize_query(params, casefold=(), coordinates=()):
+    """Build a stable query string so equivalent requests share a cache entry.
+    Parameters are sorted and keep only their last value, the one the views
+    read, with blanks dropped; casefold values are lowercased (not
+    str.casefold(), which merges names iexact tells apart, like "Straße" and
+    "STRASSE") and coordinates are snapped to the configured grid.
+    """
+    items = [
+        (name, _normalize_query_value(name, params[name], casefold, coordinates))
+        for name in sorted(params)
+        if params[name]
+    ]
+    return urlencode(items)
+
+
+def _normalize_query_value(name, value, casefold, coordinates):
+    if name in casefold:
+        return value.lower()
+    if name in coordinates:
+        try:
+            return str(snap_coordinate(float(value)))
+        except ValueError:
+            return value
+    return value
+
+
+def get_catalogue_cache_key(name, scopes, url):
+    versions = ".".join(str(version) for version in get_cache_versions(scopes))
+    url_hash = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    return f"catalogue:{name}:{versions}:{url_hash}"
+
+
+def _stats_key(name, outcome):
+    return f"catalogue:stats:{name}:{outcome}"
+
+
+def record_cache_lookup(name, *, hit):
+    incr_counter(_stats_key(name, "hits" if hit else "misses"))
+
+
+def get_cache_stats(names):
+    """Map endpoint names to their hit, miss and hit ratio counters"""
+    outcomes = ["hits", "misses"]
+    keys = [_stats_key(name, outcome) for name in names for outcome in outcomes]
+    counts = cache.get_many(keys)
+    stats = {}
+    for name in names:
+        hits = counts.get(_stats_key(name, "hits"), 0)
+        misses = counts.get(_stats_key(name, "misses"), 0)
+        lookups = hits + misses
+        stats[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+    return stats
+
+
+def _availability_key(book_id):
+    return f"catalogue:availability:{book_id}"
+
+
+def get_available_copies(book_ids):
+    """Map book ids to available copies, reading through the cache"""
+    from .models import Book
+
+    keys = {_availability_key(book_id): book_id for book_id in book_ids}
+    available = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [book_id for book_id in book_ids if book_id not in available]
+    if missing:
+        fetched = dict(
+            Book.objects.filter(pk__in=missing).values_list("pk", "available_copies"),
+        )
+        cache.set_many(
+            {_availability_key(pk): value for pk, value in fetched.items()},
+            AVAILABILITY_CACHE_TIMEOUT,
+        )
+        available.update(fetched)
+    return available
+
+
+def expire_inventory_on_commit(book_ids):
+    """Drop cached availability of the given books once the transaction commits"""
+    keys = [_availability_key(book_id) for book_id in book_ids]
+
+    def expire():
+        cache.delete_many(keys)
+        bump_cache_version("inventory")
+
+    transaction.on_commit(expire)
@@ -1,16 +1,271 @@
-import json
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from itertools import islice
 
-from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core.cache import cache
 
+from .availability import AVAILABILITY_TOPICS
+from .availability import get_book_groups
+from .availability import get_topic_group
+from .availability import get_topic_seqs
+from .availability import resume_topic
+
+logger = logging.getLogger(__name__)
+
+MAX_SUBSCRIPTIONS = 100
+MAX_CONNECTIONS_PER_USER = 5
+# Bounds the per-socket send queue; the oldest events are dropped beyond it.
+MAX_PENDING_EVENTS = 500
+# Sockets hold a connection slot for this long unless their writer refreshes
+# it, so slots of a crashed worker free up quickly.
+CONNECTION_TTL = 90
+CONNECTION_REFRESH_INTERVAL = 30
+METRICS_LOG_INTERVAL = 60
+
+
+class SocketMetrics:
+    """Availability socket and send queue counters of this process.
+    max_queue_depth is the deepest socket queue since the last log.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.queued_events = 0
+        self.max_queue_depth = 0
+        self.dropped_events = 0
+        self.logged_at = time.monotonic()
+
+    def snapshot(self):
+        return {
+            "connections": self.connections,
+            "queued_events": self.queued_events,
+            "max_queue_depth": self.max_queue_depth,
+            "dropped_events": self.dropped_events,
+        }
+
+    def log_periodically(self):
+        now = time.monotonic()
+        if now - self.logged_at >= METRICS_LOG_INTERVAL:
+            self.logged_at = now
+            logger.info("Availability sockets: %s", self.snapshot())
+            self.max_queue_depth = 0
+
+
+socket_metrics = SocketMetrics()
+
+
+def _connection_key(user_id, slot):
+    return f"availability:connection:{user_id}:{slot}"
+
+
+def open_connection(user_id, channel_name):
+    """Claim a free connection slot of the user for the socket, or None once
+    MAX_CONNECTIONS_PER_USER live sockets hold them all
+    """
+    for slot in range(MAX_CONNECTIONS_PER_USER):
+        key = _connection_key(user_id, slot)
+        if cache.add(key, channel_name, timeout=CONNECTION_TTL):
+            return key
+    return None
+
+
+def refresh_connection(key, channel_name):
+    """Keep the socket's slot alive, taking it back if it expired meanwhile"""
+    owner = cache.get(key)
+    if owner == channel_name:
+        cache.touch(key, CONNECTION_TTL)
+    elif owner is None:
+        cache.add(key, channel_name, timeout=CONNECTION_TTL)
+
+
+def close_connection(key, channel_name):
+    # The slot may have expired and been claimed by another socket.
+    if cache.get(key) == channel_name:
+        cache.delete(key)
+
+
+class BookAvailabilityConsumer(AsyncJsonWebsocketConsumer):
+    """Forward availability events for the books, libraries and categories
+    a socket subscribed to, e.g. {"action": "subscribe", "topic": "library",
+    "ids": [1, 2]}. Reconnecting clients add "since": {"1": <last seq>} to get
+    the events they missed, or a snapshot once those are no longer kept.
+
+    Only authenticated users connect, at most MAX_CONNECTIONS_PER_USER at a
+    time. Events wait in a per-socket queue that keeps the latest event per
+    book; a frame reporting "dropped" means the client should resume.
+    """
 
-class BookAvailabilityConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.group_name = "book_availability"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        self.subscriptions = set()
+        self.connection = None
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.connection = await database_sync_to_async(open_connection)(
+            user.pk,
+            self.channel_name,
+        )
+        if self.connection is None:
+            await self.close(code=4429)
+            return
+
+        self.pending = {}
+        self.dropped = 0
+        self.events_ready = asyncio.Event()
+        self.writer = asyncio.create_task(self.write_events())
+        socket_metrics.connections += 1
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        for group in self.subscriptions:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if self.connection is None:
+            return
+        self.writer.cancel()
+        socket_metrics.connections -= 1
+        socket_metrics.queued_events -= len(self.pending)
+        await database_sync_to_async(close_connection)(
+            self.connection,
+            self.channel_name,
+        )
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get("action") if isinstance(content, dict) else None
+        if action not in ["subscribe", "unsubscribe"]:
+            await self.send_json({"error": "Unknown action"})
+            return
+
+        topic = content.get("topic")
+        ids = content.get("ids")
+        if topic not in AVAILABILITY_TOPICS or not isinstance(ids, list):
+            await self.send_json({"error": "Expected a topic and a list of ids"})
+            return
+        if not all(isinstance(pk, int) for pk in ids):
+            await self.send_json({"error": "Ids must be integers"})
+            return
+
+        if action == "subscribe":
+            await self.subscribe(topic, ids, content.get("since", {}))
+        else:
+            await self.unsubscribe(topic, ids)
+
+    async def subscribe(self, topic, ids, since):
+        if not isinstance(since, dict) or not all(
+            isinstance(seq, int) for seq in since.values()
+        ):
+            await self.send_json({"error": "Since must map ids to sequence numbers"})
+            return
+
+        groups = {pk: get_topic_group(topic, pk) for pk in ids}
+        new_groups = set(groups.values()) - self.subscriptions
+        if len(self.subscriptions) + len(new_groups) > MAX_SUBSCRIPTIONS:
+            await self.send_json({"error": "Too many subscriptions"})
+            return
+        for group in new_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.subscriptions |= new_groups
+
+        seqs = await database_sync_to_async(get_topic_seqs)(list(groups.values()))
+        await self.send_json(
+            {
+                "action": "subscribe",
+                "topic": topic,
+                "ids": ids,
+                "seq": {str(pk): seqs[group] for pk, group in groups.items()},
+            },
+        )
+
+        for pk, group in groups.items():
+            if str(pk) not in since:
+                continue
+            frame = await database_sync_to_async(resume_topic)(
+                topic,
+                pk,
+                since[str(pk)],
+            )
+            if "events" in frame:
+                await self.send_events(group, frame["events"])
+            else:
+                await self.send_json(frame)
+
+    async def unsubscribe(self, topic, ids):
+        groups = {get_topic_group(topic, pk) for pk in ids} & self.subscriptions
+        for group in groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.subscriptions -= groups
+        await self.send_json({"action": "unsubscribe", "topic": topic, "ids": ids})
+
+    def get_delivery_group(self, event):
+        """First subscribed group matching an event, the only one delivering it"""
+        return next(
+            (g for g in get_book_groups(event) if g in self.subscriptions),
+            None,
+        )
+
+    async def send_events(self, group, events):
+        self.queue_events(
+            [event for event in events if self.get_delivery_group(event) == group],
+        )
+
+    def queue_events(self, events):
+        """Queue events for the writer, keeping only the latest one per book"""
+        if not events:
+            return
+        depth = len(self.pending)
+        for event in events:
+            key = (event["topic"], event["book_id"])
+            self.pending.pop(key, None)
+            self.pending[key] = event
+
+        overflow = len(self.pending) - MAX_PENDING_EVENTS
+        if overflow > 0:
+            for key in list(islice(self.pending, overflow)):
+                del self.pending[key]
+            self.dropped += overflow
+            socket_metrics.dropped_events += overflow
+
+        socket_metrics.queued_events += len(self.pending) - depth
+        socket_metrics.max_queue_depth = max(
+            socket_metrics.max_queue_depth,
+            len(self.pending),
+        )
+        self.events_ready.set()
+
+    async def write_events(self):
+        """Send queued events as one frame whenever the socket keeps up, and
+        refresh the socket's connection slot while it stays open
+        """
+        refreshed_at = time.monotonic()
+        while True:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(
+                    self.events_ready.wait(),
+                    CONNECTION_REFRESH_INTERVAL,
+                )
+            if time.monotonic() - refreshed_at >= CONNECTION_REFRESH_INTERVAL:
+                await database_sync_to_async(refresh_connection)(
+                    self.connection,
+                    self.channel_name,
+                )
+                refreshed_at = time.monotonic()
+                # Also report while no frame goes out, e.g. a stalled socket.
+                socket_metrics.log_periodically()
+            if not self.events_ready.is_set():
+                continue
+            self.events_ready.clear()
+            frame = {"events": list(self.pending.values())}
+            self.pending.clear()
+            socket_metrics.queued_events -= len(frame["events"])
+            if self.dropped:
+                frame["dropped"] = self.dropped
+                self.dropped = 0
+            await self.send_json(frame)
+            socket_metrics.log_periodically()
 
-    async def book_available(self, event):
-        await self.send(text_data=json.dumps({"message": event["message"]}))
+    async def availability_events(self, event):
+        await self.send_events(event["group"], event["events"])
@@ -0,0 +1,30 @@
+from functools import cache
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template.loader import get_template
+
+BORROW_CONFIRMATION_TEMPLATE = "emails/borrow_confirmation.txt"
+BORROW_REMINDER_TEMPLATE = "emails/borrow_reminder.txt"
+
+
+@cache
+def get_email_template(name):
+    """Load and compile an email template once per worker process"""
+    return get_template(name)
+
+
+def render_email(name, context):
+    return get_email_template(name).render(context)
+
+
+def render_emails(name, contexts):
+    """Render many messages from one compiled template"""
+    template = get_email_template(name)
+    return [template.render(context) for context in contexts]
+
+
+@receiver(setting_changed)
+def clear_email_templates(setting, **kwargs):
+    if setting == "TEMPLATES":
+        get_email_template.cache_clear()
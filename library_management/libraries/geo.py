@@ -0,0 +1,136 @@
+import logging
+import math
+from collections.abc import Sequence
+
+from django.conf import settings
+
+from .cache import get_cache_versions
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_LATITUDE = 90
+MAX_LONGITUDE = 180
+
+
+def get_bounding_box(lat, lon, radius):
+    """Get (min_lat, max_lat, min_lon, max_lon) enclosing radius km around a point.
+    min_lon is greater than max_lon when the box crosses the antimeridian.
+    """
+    delta_lat = radius / KM_PER_DEGREE
+    min_lat = max(lat - delta_lat, -MAX_LATITUDE)
+    max_lat = min(lat + delta_lat, MAX_LATITUDE)
+    if abs(min_lat) == MAX_LATITUDE or abs(max_lat) == MAX_LATITUDE:
+        return min_lat, max_lat, -MAX_LONGITUDE, MAX_LONGITUDE
+
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    delta_lon = radius / (KM_PER_DEGREE * cos_lat)
+    if delta_lon >= MAX_LONGITUDE:
+        return min_lat, max_lat, -MAX_LONGITUDE, MAX_LONGITUDE
+
+    min_lon = (lon - delta_lon + MAX_LONGITUDE) % 360 - MAX_LONGITUDE
+    max_lon = (lon + delta_lon + MAX_LONGITUDE) % 360 - MAX_LONGITUDE
+    return min_lat, max_lat, min_lon, max_lon
+
+
+class LibraryGeoIndex:
+    """In-process index of library coordinates for vectorized distance ranking.
+    Rebuilt lazily whenever the library cache version changes, which the
+    Library save/delete signals bump.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._arrays = None
+        self._warned = False
+
+    def is_enabled(self):
+        if not settings.LIBRARY_GEO_INDEX:
+            return False
+        if np is None:
+            if not self._warned:
+                logger.warning(
+                    "LIBRARY_GEO_INDEX is on but numpy is not installed; "
+                    "ranking libraries in the database instead",
+                )
+                self._warned = True
+            return False
+        return True
+
+    def _get_arrays(self):
+        from .models import Library
+
+        (version,) = get_cache_versions(["library"])
+        if self._arrays is None or self._version != version:
+            rows = Library.objects.values_list("pk", "latitude", "longitude")
+            ids, lats, lons = zip(*rows, strict=True) if rows else ((), (), ())
+            self._arrays = (
+                np.array(ids, dtype=np.int64),
+                np.radians(np.array(lats, dtype=np.float64)),
+                np.radians(np.array(lons, dtype=np.float64)),
+            )
+            self._version = version
+        return self._arrays
+
+    def nearest(self, lat, lon, *, k=None, radius=None, candidates=None):
+        """Rank library ids by haversine distance in km from (lat, lon).
+        Returns parallel lists of ids and distances, nearest first.
+        """
+        ids, lats, lons = self._get_arrays()
+        if candidates is not None:
+            mask = np.isin(ids, np.fromiter(candidates, dtype=np.int64))
+            ids, lats, lons = ids[mask], lats[mask], lons[mask]
+
+        lat, lon = math.radians(lat), math.radians(lon)
+        a = (
+            np.sin((lats - lat) / 2) ** 2
+            + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+        )
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+        if radius is not None:
+            within = distances <= radius
+            ids, distances = ids[within], distances[within]
+
+        if k is not None and k < len(ids):
+            order = np.argpartition(distances, k)[:k]
+            order = order[np.argsort(distances[order])]
+        else:
+            order = np.argsort(distances)
+        return ids[order].tolist(), distances[order].tolist()
+
+
+library_geo_index = LibraryGeoIndex()
+
+
+class RankedLibraries(Sequence):
+    """Libraries in a precomputed order, fetching only the rows that are sliced"""
+
+    def __init__(self, queryset, ids, distances):
+        self.queryset = queryset
+        self.ids = ids
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            index = range(len(self))[index]
+            return self[index : index + 1][0]
+        ids = self.ids[index]
+        libraries = self.queryset.in_bulk(ids)
+        ranked = []
+        for library_id, distance in zip(ids, self.distances[index], strict=True):
+            # Skip libraries deleted since the index was built.
+            if library_id in libraries:
+                library = libraries[library_id]
+                library.distance = distance
+                ranked.append(library)
+        return ranked
@@ -0,0 +1,76 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from library_management.libraries.api.fast_serializers import FastBookListSerializer
+from library_management.libraries.api.fast_serializers import (
+    FastLoadedAuthorListSerializer,
+)
+from library_management.libraries.api.serializers import BookSerializer
+from library_management.libraries.api.serializers import LoadedAuthorSerializer
+from library_management.libraries.models import Author
+from library_management.libraries.models import Book
+
+
+class Command(BaseCommand):
+    help = "Compare DRF and fast list serializers on the current catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        books = Book.objects.select_related("category", "library").prefetch_related(
+            "authors",
+        )
+        authors = Author.objects.prefetch_related(
+            Prefetch(
+                "authored_books",
+                queryset=Book.objects.select_related("category", "library"),
+            ),
+        )
+        cases = [
+            (
+                "books",
+                lambda: BookSerializer(list(books.order_by("id")[:limit]), many=True),
+                lambda: FastBookListSerializer(
+                    list(FastBookListSerializer.get_rows(books.order_by("id")[:limit])),
+                ),
+            ),
+            (
+                "loaded-authors",
+                lambda: LoadedAuthorSerializer(
+                    list(authors.order_by("id")[:limit]),
+                    many=True,
+                ),
+                lambda: FastLoadedAuthorListSerializer(
+                    list(
+                        FastLoadedAuthorListSerializer.get_rows(
+                            authors.order_by("id")[:limit],
+                        ),
+                    ),
+                ),
+            ),
+        ]
+
+        for name, make_drf, make_fast in cases:
+            drf_time = self.measure(make_drf, options["repeat"])
+            fast_time = self.measure(make_fast, options["repeat"])
+            speedup = drf_time / fast_time if fast_time else float("inf")
+            self.stdout.write(
+                f"{name}: drf {drf_time * 1000:.2f} ms, "
+                f"fast {fast_time * 1000:.2f} ms, {speedup:.1f}x",
+            )
+
+    def measure(self, make_serializer, repeat):
+        """Best time of one query + serialize + JSON encode cycle"""
+        return min(
+            timeit.repeat(
+                lambda: json.dumps(make_serializer().data, default=str),
+                number=1,
+                repeat=repeat,
+            ),
+        )
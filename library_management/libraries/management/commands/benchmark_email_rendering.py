@@ -0,0 +1,51 @@
+import datetime
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from library_management.libraries.emails import BORROW_REMINDER_TEMPLATE
+from library_management.libraries.emails import render_emails
+
+
+class Command(BaseCommand):
+    help = "Compare per-message render cost of render_to_string and cached templates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        count = options["messages"]
+        contexts = [
+            {
+                "loans": [
+                    {
+                        "books": [f"Book {i}", f"Book {i + 1}"],
+                        "expected_return_date": datetime.date(2025, 1, 1),
+                    },
+                ],
+            }
+            for i in range(count)
+        ]
+
+        loader_time = self.measure(
+            lambda: [
+                render_to_string(BORROW_REMINDER_TEMPLATE, context)
+                for context in contexts
+            ],
+            options["repeat"],
+        )
+        cached_time = self.measure(
+            lambda: render_emails(BORROW_REMINDER_TEMPLATE, contexts),
+            options["repeat"],
+        )
+        speedup = loader_time / cached_time if cached_time else float("inf")
+        self.stdout.write(
+            f"render_to_string {loader_time / count * 1e6:.1f} us/message, "
+            f"cached {cached_time / count * 1e6:.1f} us/message, {speedup:.1f}x",
+        )
+
+    def measure(self, render, repeat):
+        """Best time of rendering every message once"""
+        return min(timeit.repeat(render, number=1, repeat=repeat))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from library_management.libraries.cache import get_cache_stats
+from library_management.libraries.urls import router
+
+
+class Command(BaseCommand):
+    help = "Show hit ratios of the cached catalogue endpoints"
+
+    def handle(self, *args, **options):
+        names = [basename for _, _, basename in router.registry]
+        for name, stats in get_cache_stats(names).items():
+            self.stdout.write(
+                f"{name}: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['hit_ratio']:.1%} hit ratio",
+            )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from library_management.libraries.models import ActiveLoanCounter
+from library_management.libraries.models import BorrowingTransaction
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-user active book counters from borrowing transactions"
+
+    def handle(self, *args, **options):
+        totals = BorrowingTransaction.objects.active().book_totals_by_user()
+        counters = [
+            ActiveLoanCounter(user_id=user_id, active_books=total)
+            for user_id, total in totals.items()
+        ]
+
+        with transaction.atomic():
+            ActiveLoanCounter.objects.bulk_create(
+                counters,
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=["active_books"],
+            )
+            reset = (
+                ActiveLoanCounter.objects.exclude(user_id__in=list(totals))
+                .exclude(active_books=0)
+                .update(active_books=0)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reconciled {len(counters)} active counter(s), reset {reset}.",
+            ),
+        )
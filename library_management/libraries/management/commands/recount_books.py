@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from library_management.libraries.models import recount_book_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized book counts of libraries, categories and authors"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_book_counts()
+
+        self.stdout.write(
+            self.style.SUCCESS("Recounted library, category and author books."),
+        )
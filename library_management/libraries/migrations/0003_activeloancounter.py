@@ -0,0 +1,44 @@
+# Generated by Django 5.1.9 on 2026-10-18 17:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    BorrowingTransaction = apps.get_model("libraries", "BorrowingTransaction")
+    ActiveLoanCounter = apps.get_model("libraries", "ActiveLoanCounter")
+    counts = (
+        BorrowingTransaction.objects.filter(status__in=["active", "overdue"])
+        .values("user")
+        .annotate(total=Count("books"))
+    )
+    ActiveLoanCounter.objects.bulk_create(
+        ActiveLoanCounter(user_id=row["user"], active_books=row["total"])
+        for row in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0002_alter_author_options_alter_book_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveLoanCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_books', models.PositiveIntegerField(default=0, verbose_name='Active Books')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='active_loan_counter', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Active Loan Counter',
+                'verbose_name_plural': 'Active Loan Counters',
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
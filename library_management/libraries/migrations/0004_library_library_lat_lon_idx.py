@@ -0,0 +1,17 @@
+# Generated by Django 5.1.9 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0003_activeloancounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='library',
+            index=models.Index(fields=['latitude', 'longitude'], name='library_lat_lon_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.9 on 2026-10-18 17:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+
+def populate_search_vector(apps, schema_editor):
+    Book = apps.get_model("libraries", "Book")
+    author_names = (
+        Book.authors.through.objects.filter(book_id=OuterRef("pk"))
+        .values("book_id")
+        .annotate(
+            names=StringAgg(
+                Concat("author__first_name", Value(" "), "author__last_name"),
+                " ",
+            ),
+        )
+        .values("names")
+    )
+    Book.objects.update(
+        search_vector=(
+            SearchVector("title", "isbn", weight="A", config="simple")
+            + SearchVector(Subquery(author_names), weight="B", config="simple")
+            + SearchVector("description", weight="C", config="simple")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0004_library_library_lat_lon_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Search Vector'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.9 on 2026-10-18 17:25
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0005_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(django.db.models.functions.text.Upper('last_name'), name='author_last_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='category_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='library',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='library_name_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.9 on 2026-10-18 18:05
+
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Subquery
+
+
+class SubqueryCount(Subquery):
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) _count)"
+    output_field = IntegerField()
+
+
+def populate_book_counts(apps, schema_editor):
+    Book = apps.get_model("libraries", "Book")
+    for model_name, lookup in [
+        ("Library", "library_id"),
+        ("Category", "category_id"),
+    ]:
+        apps.get_model("libraries", model_name).objects.update(
+            book_count=SubqueryCount(
+                Book.objects.filter(**{lookup: OuterRef("pk")}).values("pk"),
+            ),
+        )
+    apps.get_model("libraries", "Author").objects.update(
+        book_count=SubqueryCount(
+            Book.authors.through.objects.filter(author_id=OuterRef("pk")).values("pk"),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0006_author_last_name_upper_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Book Count'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Book Count'),
+        ),
+        migrations.AddField(
+            model_name='library',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Book Count'),
+        ),
+        migrations.RunPython(populate_book_counts, migrations.RunPython.noop),
+    ]
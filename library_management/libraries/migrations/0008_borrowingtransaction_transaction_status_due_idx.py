@@ -0,0 +1,17 @@
+# Generated by Django 5.1.9 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraries', '0007_author_book_count_category_book_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowingtransaction',
+            index=models.Index(fields=['status', 'expected_return_date'], name='transaction_status_due_idx'),
+        ),
+    ]
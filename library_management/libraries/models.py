@@ -1,17 +1,56 @@
+import re
 from datetime import timedelta
+from decimal import Decimal
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.db.models.functions import ExtractDay
+from django.db.models.functions import Greatest
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .availability import AVAILABILITY_FIELDS
+from .availability import notify_books_available
+from .availability import notify_books_unavailable
+from .cache import expire_inventory_on_commit
+
 User = get_user_model()
 
+# "simple" keeps names and ISBNs intact, which prefix matching relies on.
+SEARCH_CONFIG = "simple"
+MAX_SEARCH_TERMS = 10
+
+
+class SubqueryCount(Subquery):
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) _count)"
+    output_field = IntegerField()
+
+
+def adjust_book_count(model, ids, delta):
+    """Add delta to the denormalized book_count of the given rows"""
+    if delta and ids:
+        model.objects.filter(pk__in=ids).update(
+            book_count=Greatest(F("book_count") + delta, 0),
+        )
+
 
 class Library(models.Model):
     name = models.CharField(_("Library Name"), max_length=200)
@@ -21,10 +60,19 @@ class Library(models.Model):
     phone = models.CharField(_("Phone Number"), max_length=20, blank=True)
     email = models.EmailField(_("Email"), blank=True)
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    book_count = models.PositiveIntegerField(_("Book Count"), default=0, editable=False)
 
     class Meta:
         verbose_name = _("Library")
         verbose_name_plural = _("Libraries")
+        indexes = [
+            models.Index(
+                fields=["latitude", "longitude"],
+                name="library_lat_lon_idx",
+            ),
+            # Serves the name__iexact filters, which compare UPPER(name).
+            models.Index(Upper("name"), name="library_name_upper_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -33,10 +81,14 @@ class Library(models.Model):
 class Category(models.Model):
     name = models.CharField(_("Category Name"), max_length=100, unique=True)
     description = models.TextField(_("Description"), blank=True)
+    book_count = models.PositiveIntegerField(_("Book Count"), default=0, editable=False)
 
     class Meta:
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
+        indexes = [
+            models.Index(Upper("name"), name="category_name_upper_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -47,10 +99,14 @@ class Author(models.Model):
     last_name = models.CharField(_("Last Name"), max_length=100)
     bio = models.TextField(_("Biography"), blank=True)
     birth_date = models.DateField(_("Birth Date"), null=True, blank=True)
+    book_count = models.PositiveIntegerField(_("Book Count"), default=0, editable=False)
 
     class Meta:
         verbose_name = _("Author")
         verbose_name_plural = _("Authors")
+        indexes = [
+            models.Index(Upper("last_name"), name="author_last_name_upper_idx"),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -60,6 +116,116 @@ class Author(models.Model):
         return f"{self.first_name} {self.last_name}"
 
 
+def build_prefix_search_query(text):
+    """Turn free text into a ranked prefix query, e.g. "intro alg" -> intro:* & alg:*"""
+    terms = re.findall(r"[^\W_]+", text)[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return SearchQuery(
+        " & ".join(f"{term}:*" for term in terms),
+        search_type="raw",
+        config=SEARCH_CONFIG,
+    )
+
+
+class BookQuerySet(models.QuerySet):
+    def borrow_copies(self):
+        """Decrease available copies of every book that still has one.
+        Returns the number of books updated; the caller expires their
+        cached availability.
+        """
+        return self.filter(available_copies__gt=0).update(
+            available_copies=F("available_copies") - 1,
+        )
+
+    def return_copies(self):
+        """Increase available copies of every book that has one out.
+        Returns the number of books updated; the caller expires their
+        cached availability.
+        """
+        return self.filter(available_copies__lt=F("total_copies")).update(
+            available_copies=F("available_copies") + 1,
+        )
+
+    def update_search_vector(self):
+        """Rebuild the search vector from title, ISBN, author names and description"""
+        author_names = (
+            Book.authors.through.objects.filter(book_id=OuterRef("pk"))
+            .values("book_id")
+            .annotate(
+                names=StringAgg(
+                    Concat("author__first_name", Value(" "), "author__last_name"),
+                    " ",
+                ),
+            )
+            .values("names")
+        )
+        return self.update(
+            search_vector=(
+                SearchVector("title", "isbn", weight="A", config=SEARCH_CONFIG)
+                + SearchVector(Subquery(author_names), weight="B", config=SEARCH_CONFIG)
+                + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+            ),
+        )
+
+    def search(self, text):
+        """Filter to books matching text by prefix, best matches first"""
+        query = build_prefix_search_query(text)
+        if query is None:
+            return self.none()
+        return (
+            self.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "id")
+        )
+
+    def checkout(self):
+        """Borrow one copy of every book and notify about the ones
+        that ran out. Returns the number of books updated.
+        """
+        with transaction.atomic():
+            # Lock the books first so no other checkout or return can move
+            # one onto or off its last copy between reading and claiming it.
+            books = list(
+                self.filter(available_copies__gt=0)
+                .select_for_update(of=("self",))
+                .order_by("pk")
+                .values("available_copies", *AVAILABILITY_FIELDS),
+            )
+            emptied = [book for book in books if book["available_copies"] == 1]
+            emptied_ids = [book["id"] for book in emptied]
+            spare_ids = [book["id"] for book in books if book["available_copies"] > 1]
+            updated = Book.objects.filter(
+                pk__in=emptied_ids,
+                available_copies=1,
+            ).update(available_copies=0)
+            updated += Book.objects.filter(pk__in=spare_ids).borrow_copies()
+            if updated:
+                expire_inventory_on_commit([book["id"] for book in books])
+        notify_books_unavailable(emptied)
+        return updated
+
+    def restock(self):
+        """Return one copy of every book and notify about the ones
+        that were out of stock. Returns the number of books updated.
+        """
+        with transaction.atomic():
+            books = list(
+                self.filter(available_copies__lt=F("total_copies"))
+                .select_for_update(of=("self",))
+                .order_by("pk")
+                .values("available_copies", *AVAILABILITY_FIELDS),
+            )
+            restocked = [book for book in books if book["available_copies"] == 0]
+            updated = Book.objects.filter(
+                pk__in=[book["id"] for book in books],
+            ).return_copies()
+            if updated:
+                expire_inventory_on_commit([book["id"] for book in books])
+        notify_books_available(restocked)
+        return updated
+
+
 class Book(models.Model):
     title = models.CharField(_("Title"), max_length=300)
     isbn = models.CharField(_("ISBN"), max_length=13, unique=True)
@@ -88,10 +254,16 @@ class Book(models.Model):
     available_copies = models.PositiveIntegerField(_("Available Copies"), default=1)
     description = models.TextField(_("Description"), blank=True)
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    search_vector = SearchVectorField(_("Search Vector"), null=True, editable=False)
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Book")
         verbose_name_plural = _("Books")
+        indexes = [
+            GinIndex(fields=["search_vector"], name="book_search_vector_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -114,33 +286,110 @@ class Book(models.Model):
         return self.available_copies > 0
 
     def borrow_copy(self):
-        """Decrease available copies when borrowed"""
-        if self.available_copies > 0:
-            self.available_copies -= 1
-            self.save()
-            return True
-        return False
+        """Decrease available copies when borrowed.
+        Also notify if that was the last copy.
+        """
+        books = Book.objects.filter(pk=self.pk)
+        with transaction.atomic():
+            # Lock the row so concurrent borrows see each other's copies
+            # and exactly one of them takes the last one.
+            available = (
+                books.select_for_update()
+                .values_list("available_copies", flat=True)
+                .first()
+            )
+            if not available:
+                return False
+            books.borrow_copies()
+            expire_inventory_on_commit([self.pk])
+
+        self.available_copies = available - 1
+        if not self.available_copies:
+            notify_books_unavailable(
+                [{field: getattr(self, field) for field in AVAILABILITY_FIELDS}],
+            )
+        return True
 
     def return_copy(self):
         """Increase available copies when returned.
         Also notify if book was previously unavailable.
         """
-        if self.available_copies < self.total_copies:
-            was_unavailable = self.available_copies == 0
-            self.available_copies += 1
-            self.save()
-
-            if was_unavailable:
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    "book_availability",
-                    {
-                        "type": "book_available",
-                        "message": f"'{self.title}' is now available!",
-                    },
-                )
-            return True
-        return False
+        books = Book.objects.filter(pk=self.pk)
+        with transaction.atomic():
+            # Lock the row so a borrow racing this return cannot hide the
+            # book becoming available again.
+            available, total = books.select_for_update().values_list(
+                "available_copies",
+                "total_copies",
+            ).first() or (0, 0)
+            if available >= total:
+                return False
+            books.return_copies()
+            expire_inventory_on_commit([self.pk])
+
+        self.available_copies = available + 1
+        if self.available_copies == 1:
+            notify_books_available(
+                [{field: getattr(self, field) for field in AVAILABILITY_FIELDS}],
+            )
+        return True
+
+
+def recount_book_counts():
+    """Recompute book_count of every library, category and author"""
+    Library.objects.update(
+        book_count=SubqueryCount(
+            Book.objects.filter(library_id=OuterRef("pk")).values("pk"),
+        ),
+    )
+    Category.objects.update(
+        book_count=SubqueryCount(
+            Book.objects.filter(category_id=OuterRef("pk")).values("pk"),
+        ),
+    )
+    Author.objects.update(
+        book_count=SubqueryCount(
+            Book.authors.through.objects.filter(author_id=OuterRef("pk")).values("pk"),
+        ),
+    )
+
+
+class BorrowingTransactionQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status__in=["active", "overdue"])
+
+    def active_for(self, user):
+        return self.active().filter(user=user)
+
+    def past_due(self, today=None):
+        today = today or timezone.now().date()
+        return self.active().filter(expected_return_date__lt=today)
+
+    def mark_overdue(self, today=None, daily_penalty=1.00):
+        """Flip past-due loans to overdue and refresh their penalty in one UPDATE.
+        Like ``_skip_signals`` saves, this bypasses the pre_save receiver.
+        """
+        today = today or timezone.now().date()
+        days_overdue = ExtractDay(
+            Value(today, output_field=models.DateField()) - F("expected_return_date"),
+        )
+        return self.past_due(today).update(
+            status="overdue",
+            penalty_amount=days_overdue * Value(Decimal(str(daily_penalty))),
+        )
+
+    def book_total(self):
+        """Count books across all transactions in one aggregate query"""
+        return self.aggregate(total=Count("books"))["total"]
+
+    def book_totals_by_user(self):
+        """Map user ids to their book counts in one grouped query"""
+        return dict(
+            self.order_by()
+            .values("user")
+            .annotate(total=Count("books"))
+            .values_list("user", "total"),
+        )
 
 
 class BorrowingTransaction(models.Model):
@@ -183,9 +432,17 @@ class BorrowingTransaction(models.Model):
 
     MAX_BORROW_LIMIT = 3
 
+    objects = BorrowingTransactionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Borrowing Transaction")
         verbose_name_plural = _("Borrowing Transactions")
+        indexes = [
+            models.Index(
+                fields=["status", "expected_return_date"],
+                name="transaction_status_due_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.borrow_date.date()}"
@@ -231,13 +488,11 @@ class BorrowingTransaction(models.Model):
         return 0.00
 
     @classmethod
-    def validate_user_borrowing_limit(cls, user, new_books_count=0):
-        """Check if user can borrow more books"""
-        active_transactions = cls.objects.filter(
-            user=user,
-            status__in=["active", "overdue"],
-        )
-        total_active_books = sum(t.books.count() for t in active_transactions)
+    def validate_user_borrowing_limit(cls, user, new_books_count=0, *, lock=False):
+        """Check if user can borrow more books.
+        Pass lock=True inside a transaction to hold the user's counter row.
+        """
+        total_active_books = ActiveLoanCounter.objects.get_count(user, lock=lock)
 
         if total_active_books + new_books_count > cls.MAX_BORROW_LIMIT:
             error_message = (
@@ -261,8 +516,61 @@ class BorrowingTransaction(models.Model):
     @classmethod
     def get_user_active_book_count(cls, user):
         """Get current number of active borrowed books for a user"""
-        active_transactions = cls.objects.filter(
-            user=user,
-            status__in=["active", "overdue"],
+        return ActiveLoanCounter.objects.get_count(user)
+
+
+class ActiveLoanCounterManager(models.Manager):
+    def get_count(self, user, *, lock=False):
+        """Get the user's active book count with a single indexed lookup"""
+        if lock:
+            counter, created = self.select_for_update().get_or_create(user=user)
+            if created:
+                counter.active_books = self._count_transactions(user)
+                counter.save(update_fields=["active_books"])
+            return counter.active_books
+        count = self.filter(user=user).values_list("active_books", flat=True).first()
+        if count is None:
+            return self._count_transactions(user)
+        return count
+
+    def _count_transactions(self, user):
+        return BorrowingTransaction.objects.active_for(user).book_total()
+
+    def adjust(self, user_id, delta):
+        """Add delta to the user's active book count, never going below zero.
+        Call it once the change is saved: a missing counter is seeded from the
+        transactions, which then already include it.
+        """
+        if not delta:
+            return
+        updated = self.filter(user_id=user_id).update(
+            active_books=Greatest(F("active_books") + delta, 0),
         )
-        return sum(t.books.count() for t in active_transactions)
+        if not updated:
+            _, created = self.get_or_create(
+                user_id=user_id,
+                defaults={"active_books": self._count_transactions(user_id)},
+            )
+            if not created:
+                self.adjust(user_id, delta)
+
+
+class ActiveLoanCounter(models.Model):
+    """Denormalized number of books a user holds on active/overdue transactions"""
+
+    user = models.OneToOneField(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE,
+        related_name="active_loan_counter",
+    )
+    active_books = models.PositiveIntegerField(_("Active Books"), default=0)
+
+    objects = ActiveLoanCounterManager()
+
+    class Meta:
+        verbose_name = _("Active Loan Counter")
+        verbose_name_plural = _("Active Loan Counters")
+
+    def __str__(self):
+        return f"{self.user.email} - {self.active_books}"
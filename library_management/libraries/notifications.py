@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import transaction
+
+from library_management.libraries.buffers import CoalescingBuffer
+from library_management.libraries.tasks import send_borrow_confirmation_email
+from library_management.libraries.tasks import send_borrow_confirmation_emails
+
+CONFIRMATION_BATCH_SIZE = 100
+
+
+def send_confirmation_batch(confirmations):
+    send_borrow_confirmation_emails.delay(confirmations)
+
+
+confirmation_buffer = CoalescingBuffer(send_confirmation_batch, CONFIRMATION_BATCH_SIZE)
+
+
+def schedule_borrow_confirmation(user_email, book_titles, expected_return_date):
+    """Publish a borrow confirmation once the surrounding transaction commits"""
+    confirmation = {
+        "user_email": user_email,
+        "books": book_titles,
+        "expected_return_date": expected_return_date,
+    }
+    delay = settings.BORROW_CONFIRMATION_COALESCE_SECONDS
+    if delay:
+        transaction.on_commit(lambda: confirmation_buffer.add([confirmation], delay))
+    else:
+        transaction.on_commit(
+            lambda: send_borrow_confirmation_email.delay(
+                user_email,
+                book_titles,
+                expected_return_date,
+            ),
+        )
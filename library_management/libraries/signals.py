@@ -1,10 +1,25 @@
 # signals.py
+import logging
+
 from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
+from .cache import expire_inventory_on_commit
+from .cache import invalidate_on_commit
+from .models import ActiveLoanCounter
+from .models import Author
+from .models import Book
 from .models import BorrowingTransaction
+from .models import Category
+from .models import Library
+from .models import adjust_book_count
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(pre_save, sender=BorrowingTransaction)
@@ -24,33 +39,222 @@ def handle_book_inventory(sender, instance, action, pk_set, **kwargs):
     if getattr(instance, "_skip_signals", False):
         return
 
+    is_active = instance.status in ["active", "overdue"]
+
     if action == "post_add":
-        for book_id in pk_set:
-            book = instance.books.get(id=book_id)
-            book.borrow_copy()
+        if is_active:
+            ActiveLoanCounter.objects.adjust(instance.user_id, len(pk_set))
+        borrowed = Book.objects.filter(pk__in=pk_set).checkout()
+        if borrowed < len(pk_set):
+            logger.warning(
+                "Transaction %s borrowed %s of %s books; the rest were out of stock",
+                instance.pk,
+                borrowed,
+                len(pk_set),
+            )
 
     elif action == "post_remove":
-        from .models import Book
-
-        for book_id in pk_set:
-            book = Book.objects.get(id=book_id)
-            book.return_copy()
+        if is_active:
+            ActiveLoanCounter.objects.adjust(instance.user_id, -len(pk_set))
+        Book.objects.filter(pk__in=pk_set).restock()
 
 
 @receiver(pre_save, sender=BorrowingTransaction)
 def handle_return_process(sender, instance, **kwargs):
-    """Handle book returns when status changes to returned"""
+    """Handle book returns when status changes to returned, and re-borrow
+    the books when a returned transaction is reopened
+    """
+    instance.previous_status = None
     if getattr(instance, "_skip_signals", False):
         return
 
     if instance.pk:
         try:
             old_instance = BorrowingTransaction.objects.get(pk=instance.pk)
-            if old_instance.status != "returned" and instance.status == "returned":
-                if not instance.actual_return_date:
-                    instance.actual_return_date = timezone.now()
-
-                for book in instance.books.all():
-                    book.return_copy()
         except BorrowingTransaction.DoesNotExist:
-            pass
+            return
+        instance.previous_status = old_instance.status
+        if old_instance.status != "returned" and instance.status == "returned":
+            if not instance.actual_return_date:
+                instance.actual_return_date = timezone.now()
+
+            instance.books.all().restock()
+        elif old_instance.status == "returned" and instance.status != "returned":
+            instance.books.all().checkout()
+
+
+@receiver(post_save, sender=BorrowingTransaction)
+def update_active_loans_on_status_change(sender, instance, **kwargs):
+    """Move the transaction's books in or out of the user's active count"""
+    previous_status = getattr(instance, "previous_status", None)
+    if previous_status is None:
+        return
+
+    was_active = previous_status in ["active", "overdue"]
+    is_active = instance.status in ["active", "overdue"]
+    if was_active != is_active:
+        book_count = instance.books.count()
+        ActiveLoanCounter.objects.adjust(
+            instance.user_id,
+            book_count if is_active else -book_count,
+        )
+
+
+@receiver(pre_delete, sender=BorrowingTransaction)
+def remember_active_loan_books(sender, instance, **kwargs):
+    """Remember how many active books a deleted transaction held"""
+    instance.deleted_active_books = 0
+    if instance.status in ["active", "overdue"]:
+        instance.deleted_active_books = instance.books.count()
+
+
+@receiver(post_delete, sender=BorrowingTransaction)
+def update_active_loans_on_delete(sender, instance, **kwargs):
+    ActiveLoanCounter.objects.adjust(
+        instance.user_id,
+        -getattr(instance, "deleted_active_books", 0),
+    )
+
+
+@receiver(post_save, sender=Library)
+@receiver(post_delete, sender=Library)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalogue_cache(sender, **kwargs):
+    """Expire cached catalogue listings that include the changed model"""
+    invalidate_on_commit(sender._meta.model_name)  # noqa: SLF001
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def expire_book_availability(sender, instance, **kwargs):
+    """Drop the cached availability of a book saved outside borrow/return"""
+    expire_inventory_on_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def invalidate_book_authors_cache(sender, action, **kwargs):
+    """Expire cached catalogue listings when book authors change"""
+    if action in ["post_add", "post_remove", "post_clear"]:
+        invalidate_on_commit("book")
+
+
+@receiver(post_save, sender=Book)
+def update_book_search_vector(sender, instance, **kwargs):
+    """Reindex a book for full-text search after it is saved"""
+    Book.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Author)
+def update_author_books_search_vector(sender, instance, created, **kwargs):
+    """Reindex an author's books when the author's name may have changed"""
+    if not created:
+        Book.objects.filter(authors=instance).update_search_vector()
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def update_book_authors_search_vector(
+    sender,
+    instance,
+    action,
+    reverse,
+    pk_set,
+    **kwargs,
+):
+    """Reindex books whose authors changed"""
+    if action == "pre_clear" and reverse:
+        instance.cleared_book_ids = list(
+            instance.authored_books.values_list("pk", flat=True),
+        )
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if not reverse:
+        Book.objects.filter(pk=instance.pk).update_search_vector()
+    elif action == "post_clear":
+        book_ids = getattr(instance, "cleared_book_ids", [])
+        Book.objects.filter(pk__in=book_ids).update_search_vector()
+    elif pk_set:
+        Book.objects.filter(pk__in=pk_set).update_search_vector()
+
+
+@receiver(pre_delete, sender=Author)
+def remember_author_books(sender, instance, **kwargs):
+    """Remember a deleted author's books, whose links cascade without m2m signals"""
+    instance.deleted_book_ids = list(
+        instance.authored_books.values_list("pk", flat=True),
+    )
+
+
+@receiver(post_delete, sender=Author)
+def update_deleted_author_books_search_vector(sender, instance, **kwargs):
+    """Reindex the books a deleted author was removed from"""
+    book_ids = getattr(instance, "deleted_book_ids", [])
+    Book.objects.filter(pk__in=book_ids).update_search_vector()
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_placement(sender, instance, **kwargs):
+    """Remember the library and category a saved book is moving away from"""
+    instance.previous_placement = None
+    if instance.pk:
+        instance.previous_placement = (
+            Book.objects.filter(pk=instance.pk)
+            .values_list("library_id", "category_id")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Book)
+def update_book_counts_on_save(sender, instance, created, **kwargs):
+    """Keep library and category book counts in step with book placement"""
+    previous = getattr(instance, "previous_placement", None)
+    if created or previous is None:
+        adjust_book_count(Library, [instance.library_id], 1)
+        adjust_book_count(Category, [instance.category_id], 1)
+        return
+
+    previous_library_id, previous_category_id = previous
+    if previous_library_id != instance.library_id:
+        adjust_book_count(Library, [previous_library_id], -1)
+        adjust_book_count(Library, [instance.library_id], 1)
+    if previous_category_id != instance.category_id:
+        adjust_book_count(Category, [previous_category_id], -1)
+        adjust_book_count(Category, [instance.category_id], 1)
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_authors(sender, instance, **kwargs):
+    """Remember a deleted book's authors, whose links cascade without m2m signals"""
+    instance.deleted_author_ids = list(instance.authors.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def update_book_counts_on_delete(sender, instance, **kwargs):
+    """Decrease book counts of everything the deleted book belonged to"""
+    adjust_book_count(Library, [instance.library_id], -1)
+    adjust_book_count(Category, [instance.category_id], -1)
+    adjust_book_count(Author, getattr(instance, "deleted_author_ids", []), -1)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def update_author_book_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep author book counts in step with book authorship"""
+    if action == "pre_clear" and not reverse:
+        instance.cleared_author_ids = list(
+            instance.authors.values_list("pk", flat=True),
+        )
+    elif action in ["post_add", "post_remove"]:
+        delta = 1 if action == "post_add" else -1
+        if reverse:
+            adjust_book_count(Author, [instance.pk], delta * len(pk_set))
+        else:
+            adjust_book_count(Author, pk_set, delta)
+    elif action == "post_clear":
+        if reverse:
+            Author.objects.filter(pk=instance.pk).update(book_count=0)
+        else:
+            adjust_book_count(Author, getattr(instance, "cleared_author_ids", []), -1)
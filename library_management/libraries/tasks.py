@@ -1,13 +1,28 @@
+from datetime import date
 from datetime import timedelta
+from itertools import batched
+from itertools import groupby
 
+from celery import group
 from celery import shared_task
 from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail import get_connection
 from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.db.models import Prefetch
 from django.utils import timezone
 
+from library_management.libraries.emails import BORROW_CONFIRMATION_TEMPLATE
+from library_management.libraries.emails import BORROW_REMINDER_TEMPLATE
+from library_management.libraries.emails import render_email
+from library_management.libraries.emails import render_emails
+from library_management.libraries.models import Book
 from library_management.libraries.models import BorrowingTransaction
 
+REMINDER_BATCH_SIZE = 200
+REMINDER_CHUNK_SIZE = 500
+OVERDUE_SWEEP_CHUNK_SIZE = 1000
+
 
 @shared_task
 def send_borrow_confirmation_email(user_email, book_titles, expected_return_date):
@@ -17,7 +32,7 @@ def send_borrow_confirmation_email(user_email, book_titles, expected_return_date
         "expected_return_date": expected_return_date,
     }
 
-    message = render_to_string("emails/borrow_confirmation.txt", context)
+    message = render_email(BORROW_CONFIRMATION_TEMPLATE, context)
 
     send_mail(
         subject,
@@ -28,32 +43,133 @@ def send_borrow_confirmation_email(user_email, book_titles, expected_return_date
 
 
 @shared_task
-def send_due_soon_reminders():
-    today = timezone.now().date()
-    due_soon_range = [today + timedelta(days=i) for i in range(1, 4)]
+def send_borrow_confirmation_emails(confirmations):
+    """Send coalesced confirmations over a single SMTP connection"""
+    bodies = render_emails(
+        BORROW_CONFIRMATION_TEMPLATE,
+        [
+            {
+                "books": confirmation["books"],
+                "expected_return_date": confirmation["expected_return_date"],
+            }
+            for confirmation in confirmations
+        ],
+    )
+    messages = [
+        EmailMessage(
+            subject="Borrowing Confirmation",
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[confirmation["user_email"]],
+        )
+        for confirmation, body in zip(confirmations, bodies, strict=True)
+    ]
+    with get_connection() as connection:
+        return connection.send_messages(messages)
+
+
+def get_due_soon_range(today=None):
+    today = today or timezone.now().date()
+    return today + timedelta(days=1), today + timedelta(days=3)
 
+
+@shared_task
+def send_due_soon_reminders(batch_size=REMINDER_BATCH_SIZE):
+    """Fan reminders out as subtasks of batch_size users each"""
+    due_from, due_to = get_due_soon_range()
+    user_ids = (
+        BorrowingTransaction.objects.filter(
+            status="active",
+            expected_return_date__range=(due_from, due_to),
+        )
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+
+    batches = [
+        send_reminder_batch.s(list(batch), due_from.isoformat(), due_to.isoformat())
+        for batch in batched(user_ids.iterator(), batch_size)
+    ]
+    if batches:
+        group(batches).apply_async()
+    return len(batches)
+
+
+@shared_task
+def send_reminder_batch(user_ids, due_from, due_to, chunk_size=REMINDER_CHUNK_SIZE):
+    """Send one reminder per user over a single SMTP connection"""
+    # The range lookup walks the (status, expected_return_date) index, and
+    # iterating in chunks keeps only one batch of loans and titles in memory.
     transactions = (
         BorrowingTransaction.objects.filter(
+            user_id__in=user_ids,
             status="active",
-            expected_return_date__in=due_soon_range,
+            expected_return_date__range=(
+                date.fromisoformat(due_from),
+                date.fromisoformat(due_to),
+            ),
         )
         .select_related("user")
-        .prefetch_related("books")
+        .only("expected_return_date", "user__email")
+        .prefetch_related(Prefetch("books", queryset=Book.objects.only("title")))
+        .order_by("user_id", "expected_return_date", "pk")
     )
 
-    for tx in transactions:
-        user = tx.user
-        books = tx.books.all()
-        context = {
-            "books": [b.title for b in books],
-            "expected_return_date": tx.expected_return_date,
-        }
-
-        message = render_to_string("emails/borrow_reminder.txt", context)
+    recipients = []
+    contexts = []
+    for email, loans in groupby(
+        transactions.iterator(chunk_size=chunk_size),
+        key=lambda tx: tx.user.email,
+    ):
+        recipients.append(email)
+        contexts.append(
+            {
+                "loans": [
+                    {
+                        "books": [b.title for b in tx.books.all()],
+                        "expected_return_date": tx.expected_return_date,
+                    }
+                    for tx in loans
+                ],
+            },
+        )
 
-        send_mail(
+    messages = [
+        EmailMessage(
             subject="Return Reminder",
-            message=message,
+            body=body,
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
+            to=[email],
         )
+        for email, body in zip(
+            recipients,
+            render_emails(BORROW_REMINDER_TEMPLATE, contexts),
+            strict=True,
+        )
+    ]
+    if not messages:
+        return 0
+    with get_connection() as connection:
+        return connection.send_messages(messages)
+
+
+@shared_task
+def sweep_overdue_transactions(chunk_size=OVERDUE_SWEEP_CHUNK_SIZE):
+    """Mark past-due loans overdue in chunks of chunk_size ids to keep each
+    UPDATE short, paging through the past-due ids rather than the id range
+    """
+    today = timezone.now().date()
+    past_due = BorrowingTransaction.objects.past_due(today)
+
+    swept = 0
+    last = 0
+    while True:
+        remaining = past_due.filter(pk__gt=last)
+        ends = remaining.order_by("pk").values_list("pk", flat=True)[
+            chunk_size - 1 : chunk_size
+        ]
+        if not ends:
+            return swept + remaining.mark_overdue(today)
+        last = ends[0]
+        swept += remaining.filter(pk__lte=last).mark_overdue(today)
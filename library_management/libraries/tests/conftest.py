@@ -0,0 +1,41 @@
+import pytest
+
+from library_management.libraries.models import Author
+from library_management.libraries.models import Book
+from library_management.libraries.models import Category
+from library_management.libraries.models import Library
+
+
+@pytest.fixture
+def library(db):
+    return Library.objects.create(
+        name="ALexandria Library",
+        address="ALex, Egypt",
+        latitude=30.000,
+        longitude=31.000,
+    )
+
+
+@pytest.fixture
+def category(db):
+    return Category.objects.create(name="Programming")
+
+
+@pytest.fixture
+def author(db):
+    return Author.objects.create(first_name="Elsaeed", last_name="Ahmed")
+
+
+@pytest.fixture
+def book(library, category, author):
+    book = Book.objects.create(
+        title="Introduction to Algorithms",
+        isbn="1234567890123",
+        category=category,
+        library=library,
+        publication_year=2000,
+        total_copies=2,
+        available_copies=2,
+    )
+    book.authors.add(author)
+    return book
@@ -0,0 +1,320 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library_management.libraries.availability import REPLAY_SIZE
+from library_management.libraries.availability import availability_buffer
+from library_management.libraries.availability import get_topic_seqs
+from library_management.libraries.availability import notify_books_available
+from library_management.libraries.availability import record_events
+from library_management.libraries.availability import send_availability_events
+from library_management.libraries.consumers import MAX_CONNECTIONS_PER_USER
+from library_management.libraries.consumers import MAX_PENDING_EVENTS
+from library_management.libraries.consumers import METRICS_LOG_INTERVAL
+from library_management.libraries.consumers import BookAvailabilityConsumer
+from library_management.libraries.consumers import SocketMetrics
+from library_management.libraries.consumers import close_connection
+from library_management.libraries.consumers import open_connection
+from library_management.libraries.consumers import refresh_connection
+from library_management.libraries.consumers import socket_metrics
+from library_management.libraries.middleware import JWTAuthMiddleware
+
+
+@pytest.fixture(autouse=True)
+def _in_memory_channel_layer(settings, db):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+    }
+    cache.clear()
+
+
+def event(pk, library_id, category_id=1, kind="available"):
+    return {
+        "event": kind,
+        "book_id": pk,
+        "library_id": library_id,
+        "category_id": category_id,
+        "title": f"Book {pk}",
+        "available_copies": 1 if kind == "available" else 0,
+    }
+
+
+def books_of(frame):
+    return [(event["book_id"], event["topic"]) for event in frame["events"]]
+
+
+def open_socket(user, application=None, path="/ws/books/availability/"):
+    socket = WebsocketCommunicator(
+        application or BookAvailabilityConsumer.as_asgi(),
+        path,
+    )
+    if user is not None:
+        socket.scope["user"] = user
+    return socket
+
+
+async def receive_events(socket):
+    """Collect events until the socket goes quiet, however they were framed"""
+    events = []
+    while not await socket.receive_nothing():
+        events += books_of(await socket.receive_json_from())
+    return events
+
+
+async def connect(user, *subscriptions):
+    socket = open_socket(user)
+    connected, _ = await socket.connect()
+    assert connected
+    for topic, ids in subscriptions:
+        await socket.send_json_to({"action": "subscribe", "topic": topic, "ids": ids})
+        ack = await socket.receive_json_from()
+        assert (ack["action"], ack["topic"], ack["ids"]) == ("subscribe", topic, ids)
+    return socket
+
+
+def test_events_reach_only_subscribed_sockets(user):
+    async def scenario():
+        library_socket = await connect(user, ("library", [1]))
+        book_socket = await connect(user, ("book", [7]), ("library", [1]))
+        category_socket = await connect(user, ("category", [9]))
+
+        await sync_to_async(send_availability_events)(
+            [event(7, 1), event(8, 2), event(9, 1)],
+        )
+
+        assert await receive_events(library_socket) == [
+            (7, "library"),
+            (9, "library"),
+        ]
+        assert await receive_events(book_socket) == [(7, "book"), (9, "library")]
+        assert await receive_events(category_socket) == []
+        for socket in [library_socket, book_socket, category_socket]:
+            await socket.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_unsubscribe_and_invalid_messages(user):
+    async def scenario():
+        socket = await connect(user, ("book", [7]))
+
+        await socket.send_json_to(
+            {"action": "unsubscribe", "topic": "book", "ids": [7]},
+        )
+        assert (await socket.receive_json_from())["action"] == "unsubscribe"
+        await sync_to_async(send_availability_events)([event(7, 1)])
+        assert await socket.receive_nothing()
+
+        for invalid in [
+            {"action": "subscribe", "topic": "shelf", "ids": [1]},
+            {"action": "subscribe", "topic": "book", "ids": ["7"]},
+            {"action": "watch", "topic": "book", "ids": [7]},
+        ]:
+            await socket.send_json_to(invalid)
+            assert "error" in await socket.receive_json_from()
+        await socket.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_availability_events_coalesce_after_commit(
+    settings,
+    django_capture_on_commit_callbacks,
+):
+    settings.AVAILABILITY_BROADCAST_WINDOW = 60
+    books = [
+        {"id": pk, "title": f"Book {pk}", "library_id": 1, "category_id": 1}
+        for pk in [7, 8]
+    ]
+
+    with patch.object(availability_buffer, "send") as mock_send:
+        with django_capture_on_commit_callbacks(execute=True):
+            notify_books_available(books[:1])
+            notify_books_available(books[1:])
+            assert availability_buffer.pending == []
+        mock_send.assert_not_called()
+
+        availability_buffer.flush()
+        mock_send.assert_called_once_with([event(7, 1), event(8, 1)])
+
+
+def test_resume_replays_missed_events_or_sends_snapshot(transactional_db, user, book):
+    async def scenario():
+        socket = open_socket(user)
+        await socket.connect()
+        await socket.send_json_to(
+            {"action": "subscribe", "topic": "library", "ids": [book.library_id]},
+        )
+        seq = (await socket.receive_json_from())["seq"][str(book.library_id)]
+        await socket.disconnect()
+
+        missed = [event(book.pk, book.library_id), event(99, book.library_id)]
+        await sync_to_async(send_availability_events)(missed)
+
+        socket = open_socket(user)
+        await socket.connect()
+        for since, expected in [(seq, "events"), (seq - REPLAY_SIZE - 1, "snapshot")]:
+            await socket.send_json_to(
+                {
+                    "action": "subscribe",
+                    "topic": "library",
+                    "ids": [book.library_id],
+                    "since": {str(book.library_id): since},
+                },
+            )
+            ack = await socket.receive_json_from()
+            assert ack["seq"][str(book.library_id)] == seq + len(missed)
+            frame = await socket.receive_json_from()
+            assert list(frame) == [expected]
+            if expected == "events":
+                assert [e["seq"] for e in frame["events"]] == [seq + 1, seq + 2]
+            else:
+                assert frame["snapshot"]["seq"] == seq + len(missed)
+                assert frame["snapshot"]["books"] == [
+                    [book.pk, book.available_copies],
+                ]
+        await socket.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_sockets_require_authentication(user):
+    async def scenario():
+        connected, code = await open_socket(None).connect()
+        assert (connected, code) == (False, 4401)
+
+        token = str(AccessToken.for_user(user))
+        application = JWTAuthMiddleware(BookAvailabilityConsumer.as_asgi())
+        for query, expected in [(f"token={token}", True), ("token=invalid", False)]:
+            socket = open_socket(
+                None,
+                application,
+                f"/ws/books/availability/?{query}",
+            )
+            socket.scope["user"] = AnonymousUser()
+            connected, _ = await socket.connect()
+            assert connected is expected
+            if connected:
+                await socket.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_record_events_survives_evicted_sequence():
+    group = "availability.book.7"
+    seq = get_topic_seqs([group])[group]
+    assert [e["seq"] for e in record_events("book", group, [event(7, 1)])] == [seq + 1]
+
+    cache.clear()
+    numbered = record_events("book", group, [event(7, 1), event(7, 1)])
+
+    assert numbered[0]["seq"] > seq + 1
+    assert numbered[1]["seq"] == numbered[0]["seq"] + 1
+    assert get_topic_seqs([group])[group] == numbered[1]["seq"]
+
+
+def test_connections_are_capped_per_user(user):
+    async def scenario():
+        sockets = [open_socket(user) for _ in range(MAX_CONNECTIONS_PER_USER)]
+        for socket in sockets:
+            assert (await socket.connect())[0]
+
+        connected, code = await open_socket(user).connect()
+        assert (connected, code) == (False, 4429)
+
+        await sockets.pop().disconnect()
+        sockets.append(open_socket(user))
+        assert (await sockets[-1].connect())[0]
+        for socket in sockets:
+            await socket.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_connection_slots_of_dead_sockets_expire(user):
+    with patch("library_management.libraries.consumers.CONNECTION_TTL", 1):
+        slots = [
+            open_connection(user.pk, f"socket-{number}")
+            for number in range(MAX_CONNECTIONS_PER_USER)
+        ]
+        assert None not in slots
+        assert open_connection(user.pk, "socket-extra") is None
+
+        # Only the first socket stays alive; the others stop refreshing.
+        time.sleep(0.6)
+        refresh_connection(slots[0], "socket-0")
+        time.sleep(0.6)
+
+        assert open_connection(user.pk, "socket-new") in slots[1:]
+        close_connection(slots[0], "socket-extra")
+        assert open_connection(user.pk, "socket-extra") not in [slots[0], None]
+
+
+def test_send_queue_coalesces_and_drops_oldest():
+    consumer = BookAvailabilityConsumer()
+    consumer.subscriptions = set()
+    consumer.pending = {}
+    consumer.dropped = 0
+    consumer.events_ready = asyncio.Event()
+    dropped_before = socket_metrics.dropped_events
+    updated = {**event(7, 1, kind="unavailable"), "topic": "book"}
+
+    with patch("library_management.libraries.consumers.MAX_PENDING_EVENTS", 2):
+        consumer.queue_events(
+            [
+                {**event(7, 1), "topic": "book"},
+                {**event(8, 1), "topic": "book"},
+                updated,
+                {**event(9, 1), "topic": "book"},
+            ],
+        )
+
+    assert list(consumer.pending.values()) == [
+        updated,
+        {**event(9, 1), "topic": "book"},
+    ]
+    assert consumer.dropped == 1
+    assert socket_metrics.dropped_events == dropped_before + 1
+    assert consumer.events_ready.is_set()
+
+
+def test_socket_metrics_reset_max_queue_depth_after_logging(caplog):
+    metrics = SocketMetrics()
+    metrics.max_queue_depth = MAX_PENDING_EVENTS
+
+    metrics.log_periodically()
+    assert metrics.max_queue_depth == MAX_PENDING_EVENTS
+
+    metrics.logged_at -= METRICS_LOG_INTERVAL
+    with caplog.at_level("INFO"):
+        metrics.log_periodically()
+
+    assert f"'max_queue_depth': {MAX_PENDING_EVENTS}" in caplog.text
+    assert metrics.max_queue_depth == 0
+
+
+def test_idle_sockets_report_metrics(user):
+    async def scenario():
+        socket = open_socket(user)
+        assert (await socket.connect())[0]
+        await asyncio.sleep(0.05)
+        await socket.disconnect()
+
+    with (
+        patch(
+            "library_management.libraries.consumers.CONNECTION_REFRESH_INTERVAL",
+            0.01,
+        ),
+        patch.object(socket_metrics, "log_periodically") as mock_log,
+    ):
+        async_to_sync(scenario)()
+
+    mock_log.assert_called()
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+import pytest
+
+from library_management.libraries.geo import MAX_LATITUDE
+from library_management.libraries.geo import MAX_LONGITUDE
+from library_management.libraries.geo import LibraryGeoIndex
+from library_management.libraries.geo import get_bounding_box
+from library_management.libraries.models import Library
+
+
+def test_bounding_box_around_point():
+    min_lat, max_lat, min_lon, max_lon = get_bounding_box(30.0, 31.0, 111.19)
+
+    assert min_lat == pytest.approx(29.0, abs=1e-3)
+    assert max_lat == pytest.approx(31.0, abs=1e-3)
+    assert min_lon < 31.0 - 1 < 31.0 + 1 < max_lon
+
+
+def test_bounding_box_wraps_antimeridian():
+    _, _, min_lon, max_lon = get_bounding_box(0.0, 179.5, 200)
+
+    assert min_lon > max_lon
+
+
+def test_bounding_box_covering_pole_spans_all_longitudes():
+    _, max_lat, min_lon, max_lon = get_bounding_box(89.5, 10.0, 200)
+
+    assert max_lat == MAX_LATITUDE
+    assert (min_lon, max_lon) == (-MAX_LONGITUDE, MAX_LONGITUDE)
+
+
+@pytest.fixture
+def libraries(db):
+    return [
+        Library.objects.create(name=name, address=name, latitude=lat, longitude=lon)
+        for name, lat, lon in [
+            ("Cairo", 30.04, 31.24),
+            ("Giza", 30.01, 31.21),
+            ("Alexandria", 31.2, 29.92),
+            ("Aswan", 24.09, 32.9),
+        ]
+    ]
+
+
+def test_geo_index_nearest(libraries):
+    pytest.importorskip("numpy")
+    cairo, giza, alexandria, _ = libraries
+    index = LibraryGeoIndex()
+
+    ids, distances = index.nearest(30.03, 31.23, k=3)
+
+    assert ids == [cairo.pk, giza.pk, alexandria.pk]
+    assert distances == sorted(distances)
+
+
+def test_geo_index_radius_and_candidates(libraries):
+    pytest.importorskip("numpy")
+    cairo, giza, *_ = libraries
+    index = LibraryGeoIndex()
+
+    ids, _ = index.nearest(30.03, 31.23, radius=50, candidates=[giza.pk])
+
+    assert ids == [giza.pk]
+
+
+def test_geo_index_warns_once_without_numpy(settings, caplog):
+    settings.LIBRARY_GEO_INDEX = True
+    index = LibraryGeoIndex()
+
+    with patch("library_management.libraries.geo.np", None):
+        assert index.is_enabled() is False
+        assert index.is_enabled() is False
+
+    assert caplog.text.count("numpy is not installed") == 1
@@ -1,12 +1,19 @@
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 
 import pytest
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.utils import timezone
 
+from library_management.libraries.availability import availability_buffer
+from library_management.libraries.models import ActiveLoanCounter
 from library_management.libraries.models import Author
 from library_management.libraries.models import Book
 from library_management.libraries.models import BorrowingTransaction
@@ -21,58 +28,238 @@ def user(db):
     return User.objects.create_user(email="user@example.com", password="testpass123")  # noqa: S106
 
 
-@pytest.fixture
-def library(db):
-    return Library.objects.create(
-        name="ALexandria Library",
-        address="ALex, Egypt",
-        latitude=30.000,
-        longitude=31.000,
+def test_book_str_and_availability(book):
+    assert str(book) == "Introduction to Algorithms"
+    assert book.is_available is True
+
+
+def test_book_borrow_and_return(book, settings, django_capture_on_commit_callbacks):
+    settings.AVAILABILITY_BROADCAST_WINDOW = 0
+    assert book.borrow_copy() is True
+    book.refresh_from_db()
+    assert book.available_copies == 1
+
+    with patch("library_management.libraries.availability.async_to_sync") as mock_async:
+        book.available_copies = 0
+        book.save()
+        with django_capture_on_commit_callbacks(execute=True):
+            book.return_copy()
+            mock_async.assert_not_called()
+        book.refresh_from_db()
+        assert book.available_copies == 1
+        mock_async.assert_called()
+
+
+def test_last_copy_transitions_send_structured_events(
+    user,
+    book,
+    settings,
+    django_capture_on_commit_callbacks,
+):
+    settings.AVAILABILITY_BROADCAST_WINDOW = 0
+    book.available_copies = 1
+    book.save()
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
     )
 
+    with (
+        patch.object(availability_buffer, "send") as mock_send,
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        tx.books.add(book)
+        book.return_copy()
+        book.borrow_copy()
+
+    events = [call.args[0][0] for call in mock_send.call_args_list]
+    assert [(e["event"], e["available_copies"]) for e in events] == [
+        ("unavailable", 0),
+        ("available", 1),
+        ("unavailable", 0),
+    ]
+    assert events[0]["book_id"] == book.pk
+    assert events[0]["library_id"] == book.library_id
+
+
+def test_checkout_claims_last_copies(
+    book,
+    settings,
+    django_capture_on_commit_callbacks,
+):
+    settings.AVAILABILITY_BROADCAST_WINDOW = 0
+    last_copy, out_of_stock = (
+        Book.objects.create(
+            title=f"Volume {available}",
+            isbn=f"978000000000{available}",
+            category=book.category,
+            library=book.library,
+            publication_year=2000,
+            total_copies=1,
+            available_copies=available,
+        )
+        for available in [1, 0]
+    )
+    books = Book.objects.filter(pk__in=[book.pk, last_copy.pk, out_of_stock.pk])
+
+    with (
+        patch.object(availability_buffer, "send") as mock_send,
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        assert books.checkout() == len([book, last_copy])
+
+    assert dict(books.values_list("pk", "available_copies")) == {
+        book.pk: book.available_copies - 1,
+        last_copy.pk: 0,
+        out_of_stock.pk: 0,
+    }
+    events = [call.args[0][0] for call in mock_send.call_args_list]
+    assert [(e["event"], e["book_id"]) for e in events] == [
+        ("unavailable", last_copy.pk),
+    ]
+
+
+def test_failed_availability_broadcast_keeps_the_return(
+    user,
+    book,
+    settings,
+    caplog,
+    django_capture_on_commit_callbacks,
+):
+    settings.AVAILABILITY_BROADCAST_WINDOW = 0
+    book.available_copies = 0
+    book.save()
+
+    with (
+        patch.object(availability_buffer, "send", side_effect=ConnectionError),
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        assert book.return_copy() is True
 
-@pytest.fixture
-def category(db):
-    return Category.objects.create(name="Programming")
+    book.refresh_from_db()
+    assert book.available_copies == 1
+    assert "Failed to send a batch of 1 items" in caplog.text
 
 
-@pytest.fixture
-def author(db):
-    return Author.objects.create(first_name="Elsaeed", last_name="Ahmed")
+def test_concurrent_borrows_announce_the_last_copy(transactional_db, book, settings):
+    settings.AVAILABILITY_BROADCAST_WINDOW = 0
+    barrier = threading.Barrier(book.available_copies)
 
+    def borrow():
+        copy = Book.objects.get(pk=book.pk)
+        barrier.wait()
+        try:
+            return copy.borrow_copy()
+        finally:
+            connection.close()
 
-@pytest.fixture
-def book(library, category, author):
-    book = Book.objects.create(
-        title="Introduction to Algorithms",
-        isbn="1234567890123",
+    with (
+        patch.object(availability_buffer, "send") as mock_send,
+        ThreadPoolExecutor(book.available_copies) as executor,
+    ):
+        results = list(executor.map(lambda _: borrow(), range(book.available_copies)))
+
+    assert all(results)
+    book.refresh_from_db()
+    assert book.available_copies == 0
+    events = [call.args[0][0] for call in mock_send.call_args_list]
+    assert [(e["event"], e["book_id"]) for e in events] == [("unavailable", book.pk)]
+
+
+def test_book_borrow_copy_guards_inventory(book):
+    book.available_copies = 0
+    book.save()
+
+    assert book.borrow_copy() is False
+    book.refresh_from_db()
+    assert book.available_copies == 0
+
+
+def test_book_return_copy_guards_inventory(book):
+    with patch("library_management.libraries.availability.async_to_sync") as mock_async:
+        assert book.return_copy() is False
+        mock_async.assert_not_called()
+    book.refresh_from_db()
+    assert book.available_copies == book.total_copies
+
+
+def test_book_queryset_bulk_inventory(book, library, category):
+    other = Book.objects.create(
+        title="Clean Code",
+        isbn="9780132350884",
         category=category,
         library=library,
-        publication_year=2000,
-        total_copies=2,
-        available_copies=2,
+        publication_year=2008,
+        total_copies=1,
+        available_copies=0,
     )
-    book.authors.add(author)
-    return book
+    books = Book.objects.filter(pk__in=[book.pk, other.pk])
 
-
-def test_book_str_and_availability(book):
-    assert str(book) == "Introduction to Algorithms"
-    assert book.is_available is True
+    returned = 2
+    assert books.borrow_copies() == 1
+    assert books.return_copies() == returned
+    book.refresh_from_db()
+    other.refresh_from_db()
+    assert book.available_copies == book.total_copies
+    assert other.available_copies == 1
 
 
-def test_book_borrow_and_return(book):
-    assert book.borrow_copy() is True
+def test_transaction_books_adjust_inventory_in_bulk(user, book):
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+    tx.books.add(book)
     book.refresh_from_db()
     assert book.available_copies == 1
 
-    with patch("library_management.libraries.models.async_to_sync") as mock_async:
-        book.available_copies = 0
-        book.save()
-        book.return_copy()
-        book.refresh_from_db()
-        assert book.available_copies == 1
-        mock_async.assert_called()
+    with patch("library_management.libraries.availability.async_to_sync") as mock_async:
+        tx.books.remove(book)
+        mock_async.assert_not_called()
+    book.refresh_from_db()
+    assert book.available_copies == book.total_copies
+
+
+def test_transaction_books_shortage_is_logged(user, book, caplog):
+    book.available_copies = 0
+    book.save()
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+
+    tx.books.add(book)
+
+    book.refresh_from_db()
+    assert book.available_copies == 0
+    assert "out of stock" in caplog.text
+
+
+def test_returned_transaction_notifies_once(
+    user,
+    book,
+    settings,
+    django_capture_on_commit_callbacks,
+):
+    settings.AVAILABILITY_BROADCAST_WINDOW = 0
+    book.total_copies = 1
+    book.available_copies = 1
+    book.save()
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+    tx.books.add(book)
+
+    with (
+        patch("library_management.libraries.availability.async_to_sync") as mock_async,
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        tx.status = "returned"
+        tx.save()
+    mock_async.return_value.assert_called_once()
+    book.refresh_from_db()
+    assert book.available_copies == 1
 
 
 def test_book_invalid_available_copies(book):
@@ -131,6 +318,152 @@ def test_borrowing_limit_exceeded(user, book):
         BorrowingTransaction.validate_user_borrowing_limit(user, 1)
 
 
+def test_active_loan_counter_tracks_borrow_and_return(user, book):
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+    tx.books.add(book)
+    assert BorrowingTransaction.get_user_active_book_count(user) == 1
+
+    tx.status = "returned"
+    tx.save()
+    assert BorrowingTransaction.get_user_active_book_count(user) == 0
+
+
+def test_active_loan_counter_tracks_reopen_and_delete(user, book):
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+    tx.books.add(book)
+    tx.status = "returned"
+    tx.save()
+
+    tx.status = "active"
+    tx.save()
+    assert BorrowingTransaction.get_user_active_book_count(user) == 1
+    book.refresh_from_db()
+    assert book.available_copies == book.total_copies - 1
+
+    tx.delete()
+    assert BorrowingTransaction.get_user_active_book_count(user) == 0
+    assert BorrowingTransaction.objects.active_for(user).book_total() == 0
+
+
+def test_active_loan_counter_seeds_from_transactions(user, book):
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+    tx.books.add(book)
+    ActiveLoanCounter.objects.filter(user=user).delete()
+
+    other = Book.objects.create(
+        title="Clean Code",
+        isbn="9780132350884",
+        category=book.category,
+        library=book.library,
+        publication_year=2008,
+    )
+    tx.books.add(other)
+
+    active_books = 2
+    assert ActiveLoanCounter.objects.get(user=user).active_books == active_books
+
+
+def test_reconcile_active_loans_command(user, book):
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+    tx.books.add(book)
+    ActiveLoanCounter.objects.filter(user=user).update(active_books=3)
+
+    call_command("reconcile_active_loans", stdout=StringIO())
+
+    assert ActiveLoanCounter.objects.get(user=user).active_books == 1
+
+
+def test_transaction_queryset_book_totals(user, book):
+    other_user = User.objects.create_user(email="other@example.com", password="x")  # noqa: S106
+    for borrower in [user, user, other_user]:
+        tx = BorrowingTransaction.objects.create(
+            user=borrower,
+            expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+        )
+        tx.books.add(book)
+    tx.status = "returned"
+    tx.save()
+
+    expected_total = 2
+    assert BorrowingTransaction.objects.active_for(user).book_total() == expected_total
+    assert BorrowingTransaction.objects.active().book_totals_by_user() == {
+        user.pk: expected_total,
+    }
+
+
+def test_active_book_count_falls_back_to_aggregate(user, book):
+    tx = BorrowingTransaction.objects.create(
+        user=user,
+        expected_return_date=timezone.now().date() + datetime.timedelta(days=7),
+    )
+    tx.books.add(book)
+    ActiveLoanCounter.objects.filter(user=user).delete()
+
+    assert BorrowingTransaction.get_user_active_book_count(user) == 1
+
+
+def book_counts(*instances):
+    return [
+        type(instance).objects.values_list("book_count", flat=True).get(pk=instance.pk)
+        for instance in instances
+    ]
+
+
+def test_book_counts_follow_book_changes(book, library, category, author):
+    assert book_counts(library, category, author) == [1, 1, 1]
+
+    other_library = Library.objects.create(
+        name="Cairo Library",
+        address="Cairo, Egypt",
+        latitude=30.050,
+        longitude=31.250,
+    )
+    book.library = other_library
+    book.save()
+    assert book_counts(library, other_library) == [0, 1]
+
+    author.authored_books.clear()
+    assert book_counts(author) == [0]
+    book.authors.add(author)
+    assert book_counts(author) == [1]
+
+    book.delete()
+    assert book_counts(other_library, category, author) == [0, 0, 0]
+
+
+def test_recount_books_command(book, library, category, author):
+    Library.objects.update(book_count=5)
+    Category.objects.update(book_count=0)
+    Author.objects.update(book_count=2)
+
+    call_command("recount_books", stdout=StringIO())
+
+    assert book_counts(library, category, author) == [1, 1, 1]
+
+
+def test_search_drops_cleared_and_deleted_authors(book, author):
+    assert list(Book.objects.search("elsaeed")) == [book]
+
+    author.authored_books.clear()
+    assert list(Book.objects.search("elsaeed")) == []
+
+    book.authors.add(author)
+    author.delete()
+    assert list(Book.objects.search("elsaeed")) == []
+
+
 def test_expected_return_date_too_far(user):
     invalid_date = timezone.now().date() + datetime.timedelta(days=40)
     tx = BorrowingTransaction(
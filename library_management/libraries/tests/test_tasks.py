@@ -0,0 +1,208 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from library_management.libraries.buffers import CoalescingBuffer
+from library_management.libraries.emails import BORROW_REMINDER_TEMPLATE
+from library_management.libraries.emails import get_email_template
+from library_management.libraries.emails import render_emails
+from library_management.libraries.models import BorrowingTransaction
+from library_management.libraries.notifications import send_confirmation_batch
+from library_management.libraries.tasks import get_due_soon_range
+from library_management.libraries.tasks import send_borrow_confirmation_emails
+from library_management.libraries.tasks import send_due_soon_reminders
+from library_management.libraries.tasks import send_reminder_batch
+from library_management.libraries.tasks import sweep_overdue_transactions
+from library_management.users.tests.factories import UserFactory
+
+
+def create_transaction(user, days_until_due, status="active"):
+    tx = BorrowingTransaction(
+        user=user,
+        expected_return_date=timezone.now().date()
+        + datetime.timedelta(days=days_until_due),
+    )
+    tx.save(skip_validation=True)
+    BorrowingTransaction.objects.filter(pk=tx.pk).update(status=status)
+    return tx
+
+
+def test_sweep_overdue_transactions(user):
+    late = create_transaction(user, -3)
+    stale = create_transaction(user, -5, status="overdue")
+    returned = create_transaction(user, -2, status="returned")
+    due = create_transaction(user, 2)
+
+    swept = sweep_overdue_transactions(chunk_size=1)
+
+    assert swept == len([late, stale])
+    statuses = dict(
+        BorrowingTransaction.objects.values_list("pk", "status"),
+    )
+    assert statuses == {
+        late.pk: "overdue",
+        stale.pk: "overdue",
+        returned.pk: "returned",
+        due.pk: "active",
+    }
+    penalties = dict(
+        BorrowingTransaction.objects.values_list("pk", "penalty_amount"),
+    )
+    assert penalties[late.pk] == Decimal("3.00")
+    assert penalties[stale.pk] == Decimal("5.00")
+    assert penalties[due.pk] == Decimal("0.00")
+
+
+def test_sweep_overdue_transactions_skips_id_gaps(user, django_assert_num_queries):
+    old = create_transaction(user, -3)
+    BorrowingTransaction.objects.filter(pk=old.pk).update(id=old.pk + 100_000)
+    create_transaction(user, -1)
+
+    # One id lookup and one UPDATE per loan, then the final pair.
+    queries = 2 * len([old, "recent"]) + 2
+    with django_assert_num_queries(queries):
+        assert sweep_overdue_transactions(chunk_size=1) == len([old, "recent"])
+
+
+def test_sweep_overdue_transactions_without_past_due(user):
+    create_transaction(user, 2)
+
+    assert sweep_overdue_transactions() == 0
+
+
+def test_send_due_soon_reminders_fans_out_batches(user):
+    other_user = UserFactory()
+    for borrower in [user, user, other_user]:
+        create_transaction(borrower, 2)
+    create_transaction(other_user, 5)
+
+    with patch("library_management.libraries.tasks.group") as mock_group:
+        assert send_due_soon_reminders(batch_size=1) == len([user, other_user])
+
+    batches = mock_group.call_args.args[0]
+    assert [batch.args[0] for batch in batches] == [
+        [min(user.pk, other_user.pk)],
+        [max(user.pk, other_user.pk)],
+    ]
+    mock_group.return_value.apply_async.assert_called_once()
+
+
+def test_send_reminder_batch_groups_loans_per_user(user, book):
+    other_user = UserFactory()
+    for borrower, days_until_due in [(user, 1), (user, 3), (other_user, 2)]:
+        create_transaction(borrower, days_until_due).books.add(book)
+    create_transaction(user, 5).books.add(book)
+    create_transaction(user, 2, status="returned").books.add(book)
+
+    due_from, due_to = get_due_soon_range()
+    sent = send_reminder_batch(
+        [user.pk, other_user.pk],
+        due_from.isoformat(),
+        due_to.isoformat(),
+        chunk_size=1,
+    )
+
+    assert sent == len(mail.outbox) == len([user, other_user])
+    body = {message.to[0]: message.body for message in mail.outbox}
+    due_soon_loans = 2
+    assert body[user.email].count("Due on") == due_soon_loans
+    assert body[other_user.email].count("Due on") == 1
+
+
+def test_email_templates_compile_once():
+    contexts = [
+        {
+            "loans": [
+                {
+                    "books": [f"Book {i}"],
+                    "expected_return_date": datetime.date(2025, 1, 1),
+                },
+            ],
+        }
+        for i in range(2)
+    ]
+
+    assert get_email_template(BORROW_REMINDER_TEMPLATE) is get_email_template(
+        BORROW_REMINDER_TEMPLATE,
+    )
+    assert render_emails(BORROW_REMINDER_TEMPLATE, contexts) == [
+        render_to_string(BORROW_REMINDER_TEMPLATE, context) for context in contexts
+    ]
+
+
+def test_benchmark_email_rendering_command():
+    out = StringIO()
+    call_command(
+        "benchmark_email_rendering",
+        "--messages=5",
+        "--repeat=1",
+        stdout=out,
+    )
+    assert "us/message" in out.getvalue()
+
+
+def confirmation(user_email):
+    return {
+        "user_email": user_email,
+        "books": ["Introduction to Algorithms"],
+        "expected_return_date": "2025-01-01",
+    }
+
+
+def test_send_borrow_confirmation_emails():
+    confirmations = [confirmation("a@example.com"), confirmation("b@example.com")]
+
+    assert send_borrow_confirmation_emails(confirmations) == len(confirmations)
+    assert [message.to for message in mail.outbox] == [
+        ["a@example.com"],
+        ["b@example.com"],
+    ]
+    assert "Introduction to Algorithms" in mail.outbox[0].body
+
+
+def test_confirmation_buffer_coalesces_batches():
+    buffer = CoalescingBuffer(send_confirmation_batch, max_size=2)
+
+    with patch(
+        "library_management.libraries.notifications.send_borrow_confirmation_emails",
+    ) as mock_task:
+        buffer.add([confirmation("a@example.com")], delay=60)
+        mock_task.delay.assert_not_called()
+        assert buffer.timer is not None
+
+        buffer.add([confirmation("b@example.com")], delay=60)
+        mock_task.delay.assert_called_once_with(
+            [confirmation("a@example.com"), confirmation("b@example.com")],
+        )
+        assert buffer.timer is None
+
+        buffer.add([confirmation("c@example.com")], delay=60)
+        buffer.flush()
+        mock_task.delay.assert_called_with([confirmation("c@example.com")])
+
+        buffer.add([confirmation("d@example.com")], delay=0)
+        mock_task.delay.assert_called_with([confirmation("d@example.com")])
+
+
+def test_buffer_logs_failed_sends(caplog):
+    buffer = CoalescingBuffer(send_confirmation_batch, max_size=2)
+
+    with patch(
+        "library_management.libraries.notifications.send_borrow_confirmation_emails",
+    ) as mock_task:
+        mock_task.delay.side_effect = ConnectionError
+        buffer.add([confirmation("a@example.com")], delay=60)
+        buffer.flush()
+
+        buffer.add([confirmation("b@example.com")], delay=0)
+        mock_task.delay.assert_called_with([confirmation("b@example.com")])
+
+    failed = mock_task.delay.call_count
+    assert caplog.text.count("Failed to send a batch of 1 items") == failed
+    assert buffer.pending == []
@@ -1,12 +1,21 @@
 import datetime
+from io import StringIO
+from unittest.mock import patch
 
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.utils import timezone
 from rest_framework.status import HTTP_200_OK
 from rest_framework.status import HTTP_201_CREATED
 from rest_framework.test import APIClient
 
+from library_management.libraries.api.filters import resolve_ids
+from library_management.libraries.api.pagination import get_estimated_count
+from library_management.libraries.api.views import BookViewSet
+from library_management.libraries.cache import get_cache_stats
+from library_management.libraries.cache import get_cache_versions
 from library_management.libraries.models import Author
 from library_management.libraries.models import Book
 from library_management.libraries.models import Category
@@ -15,6 +24,11 @@ from library_management.libraries.models import Library
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -77,6 +91,89 @@ def test_library_distance_filter(api_client, sample_data):
     assert "distance" in res.data["results"][0]
 
 
+def test_library_radius_and_limit(api_client, sample_data):
+    Library.objects.create(
+        name="Giza Library",
+        address="Giza",
+        latitude=30.05,
+        longitude=31.05,
+    )
+    Library.objects.create(
+        name="Aswan Library",
+        address="Aswan",
+        latitude=24.09,
+        longitude=32.9,
+    )
+
+    res = api_client.get("/api/libraries/?latitude=30.01&longitude=31.01&radius=50")
+    assert res.status_code == HTTP_200_OK
+    assert [lib["name"] for lib in res.data["results"]] == [
+        "Cairo Library",
+        "Giza Library",
+    ]
+
+    res = api_client.get(
+        "/api/libraries/?latitude=30.01&longitude=31.01&radius=50&limit=1",
+    )
+    assert [lib["name"] for lib in res.data["results"]] == ["Cairo Library"]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "latitude=30&longitude=31&radius=nan",
+        "latitude=30&longitude=31&radius=-5",
+        "latitude=nan&longitude=31&radius=50",
+        "latitude=30&longitude=inf&radius=50",
+    ],
+)
+def test_library_non_finite_coordinates_are_ignored(api_client, sample_data, query):
+    res = api_client.get(f"/api/libraries/?{query}")
+    assert res.status_code == HTTP_200_OK
+    assert [lib["name"] for lib in res.data["results"]] == ["Cairo Library"]
+
+
+def test_library_distance_with_geo_index(api_client, sample_data, settings):
+    pytest.importorskip("numpy")
+    settings.LIBRARY_GEO_INDEX = True
+    Library.objects.create(
+        name="Aswan Library",
+        address="Aswan",
+        latitude=24.09,
+        longitude=32.9,
+    )
+
+    max_distance_km = 5
+    res = api_client.get("/api/libraries/?latitude=24.1&longitude=32.9&limit=5")
+    assert res.status_code == HTTP_200_OK
+    assert [lib["name"] for lib in res.data["results"]] == [
+        "Aswan Library",
+        "Cairo Library",
+    ]
+    assert res.data["results"][0]["distance"] < max_distance_km
+
+
+def test_library_author_filter_counts_without_duplicates(api_client, sample_data):
+    book = sample_data["book"]
+    second = Book.objects.create(
+        title="Django Advanced",
+        isbn="1234567890124",
+        category=book.category,
+        library=book.library,
+        publication_year=2001,
+    )
+    second.authors.add(sample_data["author"])
+
+    res = api_client.get("/api/libraries/?author=ahm&category=test")
+    assert res.status_code == HTTP_200_OK
+    assert len(res.data["results"]) == 1
+    assert res.data["results"][0]["book_count"] == Book.objects.count()
+
+    res = api_client.get("/api/authors/?category=test")
+    assert len(res.data["results"]) == 1
+    assert res.data["results"][0]["book_count"] == Book.objects.count()
+
+
 # AUTHOR TEST
 def test_author_filter_by_category(api_client, sample_data):
     res = api_client.get(f"/api/authors/?category={sample_data['category'].name}")
@@ -84,6 +181,30 @@ def test_author_filter_by_category(api_client, sample_data):
     assert "book_count" in res.data["results"][0]
 
 
+def test_author_filter_by_library_case_insensitive(api_client, sample_data):
+    res = api_client.get("/api/authors/?library=cairo LIBRARY")
+    assert res.status_code == HTTP_200_OK
+    assert [a["last_name"] for a in res.data["results"]] == ["Ahmed"]
+    assert res.data["results"][0]["book_count"] == 1
+
+    res = api_client.get("/api/authors/?library=Giza Library")
+    assert res.data["results"] == []
+
+
+def test_author_filter_resolves_each_name_once(api_client, sample_data):
+    with patch(
+        "library_management.libraries.api.filters.resolve_ids",
+        wraps=resolve_ids,
+    ) as mock_resolve:
+        res = api_client.get("/api/authors/?library=Cairo Library&category=Test")
+
+    assert res.data["results"][0]["book_count"] == 1
+    assert [call.args[0].__name__ for call in mock_resolve.call_args_list] == [
+        "Library",
+        "Category",
+    ]
+
+
 # BOOK TEST
 def test_book_list(api_client, sample_data):
     res = api_client.get("/api/books/")
@@ -91,6 +212,220 @@ def test_book_list(api_client, sample_data):
     assert res.data["results"][0]["title"] == "Django Foundation"
 
 
+@pytest.mark.parametrize(
+    ("url", "renamed"),
+    [
+        ("/api/libraries/?category=test", "category"),
+        ("/api/libraries/?author=ahm", "author"),
+        ("/api/authors/?library=cairo library", "library"),
+        ("/api/authors/?category=test", "category"),
+    ],
+)
+def test_filtered_listings_expire_when_filtered_on_model_is_renamed(
+    api_client,
+    sample_data,
+    django_capture_on_commit_callbacks,
+    url,
+    renamed,
+):
+    assert len(api_client.get(url).data["results"]) == 1
+
+    instance = sample_data[renamed]
+    with django_capture_on_commit_callbacks(execute=True):
+        if renamed == "author":
+            instance.last_name = "Renamed"
+        else:
+            instance.name = "Renamed"
+        instance.save()
+
+    assert api_client.get(url).data["results"] == []
+
+
+def test_book_list_cache_invalidated_by_borrow(
+    auth_client,
+    sample_data,
+    django_capture_on_commit_callbacks,
+):
+    book = sample_data["book"]
+    res = auth_client.get("/api/books/")
+    assert res.data["results"][0]["available_copies"] == book.total_copies
+
+    with django_capture_on_commit_callbacks(execute=True):
+        book.borrow_copy()
+
+    res = auth_client.get("/api/books/")
+    assert res.data["results"][0]["available_copies"] == book.total_copies - 1
+
+
+def test_book_list_overlay_keeps_catalogue_cache(
+    auth_client,
+    sample_data,
+    django_capture_on_commit_callbacks,
+):
+    book = sample_data["book"]
+    auth_client.get("/api/books/")
+    versions = get_cache_versions(BookViewSet.cache_scopes)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        book.borrow_copy()
+
+    res = auth_client.get("/api/books/")
+    assert get_cache_versions(BookViewSet.cache_scopes) == versions
+    assert res.data["results"][0]["available_copies"] == book.total_copies - 1
+    assert res.data["results"][0]["is_available"] is True
+
+
+def test_book_list_overlay_follows_direct_saves(
+    auth_client,
+    sample_data,
+    django_capture_on_commit_callbacks,
+):
+    book = sample_data["book"]
+    auth_client.get("/api/books/")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        book.available_copies = 0
+        book.save()
+
+    res = auth_client.get("/api/books/")
+    assert res.data["results"][0]["available_copies"] == 0
+    assert res.data["results"][0]["is_available"] is False
+
+
+def test_catalogue_cache_key_normalization(api_client, sample_data):
+    api_client.get("/api/books/?library=Cairo%20Library&category=Test")
+    api_client.get("/api/books/?category=test&library=cairo%20library&author=")
+    api_client.get("/api/libraries/?latitude=30.0101&longitude=31.0099")
+    api_client.get("/api/libraries/?longitude=31.0102&latitude=30.0098")
+
+    stats = get_cache_stats(["book", "library"])
+    assert stats["book"] == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+    assert stats["library"] == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+    out = StringIO()
+    call_command("catalogue_cache_stats", stdout=out)
+    assert "book: 1 hits, 1 misses, 50.0% hit ratio" in out.getvalue()
+
+
+def test_catalogue_cache_keys_follow_the_last_repeated_value(
+    api_client,
+    sample_data,
+):
+    book = sample_data["book"]
+    Book.objects.create(
+        title="Hamlet",
+        isbn="9780000000001",
+        category=Category.objects.create(name="Drama"),
+        library=book.library,
+        publication_year=1603,
+    )
+
+    res = api_client.get("/api/books/?category=Test&category=Drama")
+    assert [b["title"] for b in res.data["results"]] == ["Hamlet"]
+    res = api_client.get("/api/books/?category=Drama&category=Test")
+    assert [b["title"] for b in res.data["results"]] == ["Django Foundation"]
+
+    res = api_client.get("/api/books/?category=Test&category=")
+    assert len(res.data["results"]) == Book.objects.count()
+
+
+def test_catalogue_cache_keeps_iexact_distinct_names_apart(api_client, sample_data):
+    api_client.get("/api/books/?library=Straße")
+    api_client.get("/api/books/?library=STRASSE")
+
+    assert get_cache_stats(["book"])["book"]["hits"] == 0
+
+
+def test_book_list_keyset_pagination(api_client, sample_data):
+    book = sample_data["book"]
+    for index in range(2):
+        Book.objects.create(
+            title=f"Volume {index}",
+            isbn=f"978000000000{index}",
+            category=book.category,
+            library=book.library,
+            publication_year=2000,
+        )
+
+    res = api_client.get("/api/books/?pagination=cursor&page_size=2")
+    assert res.status_code == HTTP_200_OK
+    assert "count" not in res.data
+    assert [b["title"] for b in res.data["results"]] == [
+        "Django Foundation",
+        "Volume 0",
+    ]
+
+    res = api_client.get(res.data["next"])
+    assert [b["title"] for b in res.data["results"]] == ["Volume 1"]
+    assert res.data["next"] is None
+
+
+def test_fast_list_serializers_match_drf(api_client, sample_data, settings):
+    book = sample_data["book"]
+    author = sample_data["author"]
+    author.birth_date = datetime.date(1990, 1, 1)
+    author.save()
+    book.authors.add(Author.objects.create(first_name="Ada", last_name="Lovelace"))
+
+    responses = {}
+    for fast in [True, False]:
+        settings.CATALOGUE_FAST_SERIALIZERS = fast
+        cache.clear()
+        responses[fast] = [
+            api_client.get("/api/books/").json(),
+            api_client.get("/api/loaded-authors/").json(),
+        ]
+
+    assert responses[True] == responses[False]
+
+
+def test_benchmark_catalogue_serializers_command(sample_data):
+    out = StringIO()
+    call_command("benchmark_catalogue_serializers", "--repeat=1", stdout=out)
+    assert "books: drf" in out.getvalue()
+    assert "loaded-authors: drf" in out.getvalue()
+
+
+def test_book_search(api_client, sample_data):
+    book = sample_data["book"]
+    other = Book.objects.create(
+        title="Foundation and Empire",
+        isbn="9780553293371",
+        category=book.category,
+        library=book.library,
+        publication_year=1952,
+        description="A django of sorts",
+    )
+    other.authors.add(
+        Author.objects.create(first_name="Isaac", last_name="Asimov"),
+    )
+
+    res = api_client.get("/api/books/search/?q=djan")
+    assert res.status_code == HTTP_200_OK
+    assert [b["title"] for b in res.data["results"]] == [
+        "Django Foundation",
+        "Foundation and Empire",
+    ]
+
+    res = api_client.get("/api/books/search/?q=asim found")
+    assert [b["title"] for b in res.data["results"]] == ["Foundation and Empire"]
+
+    res = api_client.get(f"/api/books/search/?q={book.isbn}")
+    assert [b["title"] for b in res.data["results"]] == ["Django Foundation"]
+
+    res = api_client.get("/api/books/search/?q=!!")
+    assert res.data["results"] == []
+
+
+def test_book_filters_resolve_names(api_client, sample_data):
+    res = api_client.get("/api/books/?category=test&library=CAIRO library&author=ahmed")
+    assert res.status_code == HTTP_200_OK
+    assert [b["title"] for b in res.data["results"]] == ["Django Foundation"]
+
+    res = api_client.get("/api/books/?author=Asimov")
+    assert res.data["results"] == []
+
+
 #  LOADED AUTHOR TEST
 def test_loaded_authors(api_client, sample_data):
     res = api_client.get("/api/loaded-authors/")
@@ -118,3 +453,38 @@ def test_borrow_and_return_flow(auth_client, sample_data):
     return_res = auth_client.post(f"/api/borrow/{tx_id}/return/")
     assert return_res.status_code == HTTP_200_OK
     assert return_res.data["status"] == "returned"
+
+
+def test_borrow_confirmation_published_on_commit(
+    auth_client,
+    sample_data,
+    django_capture_on_commit_callbacks,
+):
+    tomorrow = timezone.now().date() + datetime.timedelta(days=1)
+    payload = {"books": [sample_data["book"].id], "expected_return_date": tomorrow}
+
+    with patch(
+        "library_management.libraries.notifications.send_borrow_confirmation_email",
+    ) as mock_task:
+        with django_capture_on_commit_callbacks() as callbacks:
+            res = auth_client.post("/api/borrow/", payload, format="json")
+        assert res.status_code == HTTP_201_CREATED
+        mock_task.delay.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        mock_task.delay.assert_called_once_with(
+            sample_data["user"].email,
+            ["Django Foundation"],
+            str(tomorrow),
+        )
+
+
+@pytest.mark.parametrize(("reltuples", "expected"), [(-1, None), (42, 42)])
+def test_estimated_count_is_unknown_for_unanalyzed_tables(reltuples, expected):
+    with patch("library_management.libraries.api.pagination.connection") as mock:
+        mock.vendor = "postgresql"
+        cursor = mock.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (reltuples,)
+
+        assert get_estimated_count(Book) == expected